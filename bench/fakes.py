@@ -0,0 +1,126 @@
+"""디스코드에 접속하지 않고 cog 핸들러를 호출하기 위한 가짜 객체들."""
+import time
+import itertools
+import discord
+
+_ids = itertools.count(10_000)
+
+class FakeUser:
+    def __init__(self, user_id: int, name: str = None):
+        self.id = user_id
+        self.name = name or f"user{user_id}"
+        self.display_name = self.name
+        self.bot = False
+
+    def mentioned_in(self, message) -> bool:
+        return False
+
+    def __eq__(self, other):
+        return isinstance(other, FakeUser) and other.id == self.id
+
+    def __hash__(self):
+        return hash(self.id)
+
+class FakeMessage:
+    """channel.send()나 followup.send()가 돌려주는 메시지"""
+
+    def __init__(self, channel, content=None, embed=None, view=None):
+        self.id = next(_ids)
+        self.channel = channel
+        self.content = content
+        self.embed = embed
+        self.view = view
+        self.edits = 0
+
+    async def edit(self, content=None, embed=None, view=None):
+        self.edits += 1
+        if content is not None:
+            self.content = content
+        if embed is not None:
+            self.embed = embed
+        if view is not None:
+            self.view = view
+        self.channel.record("edit")
+        return self
+
+class _NoTyping:
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+class FakeDMChannel(discord.DMChannel):
+    """isinstance(channel, discord.DMChannel) 검사를 통과하는 가짜 DM 채널"""
+
+    def __init__(self, user: FakeUser, api_latency: float = 0.0):
+        self.id = next(_ids)
+        self.user = user
+        self.api_latency = api_latency
+        self.sent = []
+        self.events = [] # (시각, 종류)
+
+    def record(self, kind: str):
+        self.events.append((time.perf_counter(), kind))
+
+    def typing(self):
+        return _NoTyping()
+
+    async def send(self, content=None, embed=None, view=None, **kwargs):
+        message = FakeMessage(self, content, embed, view)
+        self.sent.append(message)
+        self.record("send")
+        return message
+
+class FakeIncomingMessage:
+    """사용자가 보낸 discord.Message 흉내"""
+
+    def __init__(self, author: FakeUser, channel: FakeDMChannel, content: str):
+        self.id = next(_ids)
+        self.author = author
+        self.channel = channel
+        self.content = content
+
+class FakeResponse:
+    def __init__(self, interaction):
+        self.interaction = interaction
+        self.done = False
+        self.messages = []
+
+    def is_done(self) -> bool:
+        return self.done
+
+    async def send_message(self, content=None, embed=None, view=None, ephemeral=False, **kwargs):
+        self.done = True
+        self.messages.append(FakeMessage(self.interaction.channel, content, embed, view))
+
+    async def defer(self, ephemeral=False, **kwargs):
+        self.done = True
+
+    async def send_modal(self, modal):
+        self.done = True
+        self.interaction.modal = modal
+
+    async def edit_message(self, content=None, embed=None, view=None, **kwargs):
+        self.done = True
+        self.messages.append(FakeMessage(self.interaction.channel, content, embed, view))
+
+class FakeFollowup:
+    def __init__(self, interaction):
+        self.interaction = interaction
+
+    async def send(self, content=None, embed=None, view=None, wait=False, **kwargs):
+        return await self.interaction.channel.send(content, embed=embed, view=view)
+
+class FakeInteraction:
+    """discord.Interaction 흉내. 슬래시 커맨드 콜백과 모달 제출에 사용합니다."""
+
+    def __init__(self, client, user: FakeUser, channel: FakeDMChannel):
+        self.id = next(_ids)
+        self.client = client
+        self.user = user
+        self.channel = channel
+        self.extras = {}
+        self.modal = None
+        self.response = FakeResponse(self)
+        self.followup = FakeFollowup(self)
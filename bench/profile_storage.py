@@ -0,0 +1,151 @@
+"""프로필 저장 방식 벤치마크.
+
+본문을 profiles에 그대로 두던 스키마(버전 6)로 합성 프로필 N개를 만든 뒤,
+압축 본문을 profile_bodies로 나누는 마이그레이션(버전 7)을 적용하고
+파일 크기, 목록 조회 시간, /load 시간을 비교합니다.
+
+    python -m bench.profile_storage --profiles 100000 --output profile_storage.json
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import sqlite3
+import tempfile
+import time
+
+import migrations
+from bench.run import percentiles
+from profile_codec import ProfileCodec
+
+SECTIONS = [
+    ("기본 정보", ["이름", "나이", "종족", "직업", "소속"]),
+    ("외모", ["키", "머리색", "눈동자", "특징"]),
+    ("성격", ["장점", "단점", "말버릇"]),
+    ("배경 이야기", []),
+    ("능력", ["주무기", "특기", "약점"]),
+    ("Relationships", ["Ally", "Rival", "Mentor"]),
+]
+WORDS = ("검 마법 왕국 기사단 용 숲 고대 유적 혈통 저주 맹세 복수 동료 스승 전쟁 평화 북쪽 제국 "
+         "the a of and with sword magic kingdom order dragon forest ancient ruins oath revenge "
+         "companion mentor war peace north empire shadow light blade storm").split()
+
+def make_profile(rng: random.Random, index: int) -> str:
+    """2~4KB 정도의 마크다운 프로필을 만듭니다."""
+    lines = [f"# 캐릭터 {index}"]
+    for title, fields in SECTIONS:
+        lines.append(f"\n## {title}")
+        for field in fields:
+            lines.append(f"- **{field}**: " + " ".join(rng.choices(WORDS, k=rng.randint(2, 6))))
+        if not fields:
+            for _ in range(rng.randint(3, 6)):
+                lines.append(" ".join(rng.choices(WORDS, k=rng.randint(25, 45))) + ".")
+    return "\n".join(lines)
+
+def build_v6(path: str, count: int, users: int, seed: int):
+    rng = random.Random(seed)
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    for target in range(1, 7):
+        conn.execute("BEGIN")
+        migrations.MIGRATIONS[target - 1](conn)
+        conn.execute(f"PRAGMA user_version = {target}")
+        conn.commit()
+    for start in range(0, count, 5000):
+        conn.executemany(
+            "INSERT INTO profiles (user_id, character_name, profile_data, worldview_name, created_at) "
+            "VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)",
+            [(i % users, f"캐릭터{i}", make_profile(rng, i), f"세계관{i % 5 + 1}") for i in range(start, min(start + 5000, count))],
+        )
+        conn.commit()
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    conn.execute("VACUUM")
+    conn.close()
+
+def measure(path: str, users: int, samples: int, seed: int) -> dict:
+    """목록(전체 스캔, 사용자별 페이지)과 /load 조회 시간을 새 연결로 잽니다."""
+    rng = random.Random(seed)
+    conn = sqlite3.connect(path)
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    started = time.perf_counter()
+    conn.execute("SELECT character_name, worldview_name FROM profiles").fetchall()
+    scan = time.perf_counter() - started
+
+    pages = []
+    for _ in range(samples):
+        user_id, cursor = rng.randrange(users), 0
+        started = time.perf_counter()
+        while True:
+            rows = conn.execute(
+                "SELECT id, character_name, worldview_name FROM profiles WHERE user_id = ? AND id > ? ORDER BY id LIMIT 10",
+                (user_id, cursor)).fetchall()
+            if not rows:
+                break
+            cursor = rows[-1][0]
+        pages.append(time.perf_counter() - started)
+
+    codec = ProfileCodec()
+    if version >= 7:
+        for dict_id, name, data in conn.execute("SELECT id, codec, data FROM compression_dicts"):
+            codec.add_dictionary(dict_id, name, data)
+    count = conn.execute("SELECT MAX(id) FROM profiles").fetchone()[0]
+    loads = []
+    for _ in range(samples):
+        profile_id = rng.randint(1, count)
+        started = time.perf_counter()
+        if version >= 7:
+            row = conn.execute("SELECT codec, dict_id, data FROM profile_bodies WHERE profile_id = ?", (profile_id,)).fetchone()
+            codec.decompress(*row)
+        else:
+            conn.execute("SELECT profile_data FROM profiles WHERE id = ?", (profile_id,)).fetchone()
+        loads.append(time.perf_counter() - started)
+    conn.close()
+    return {
+        "file_bytes": os.path.getsize(path),
+        "list_scan_ms": round(scan * 1000, 2),
+        "list_pages": percentiles(pages),
+        "load": percentiles(loads),
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="프로필 저장 방식 벤치마크")
+    parser.add_argument("--profiles", type=int, default=100_000)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--samples", type=int, default=500, help="목록/로드 조회 횟수")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="profile_storage.json")
+    args = parser.parse_args(argv)
+
+    tmp = tempfile.mkdtemp()
+    try:
+        old = os.path.join(tmp, "v6.db")
+        print(f"합성 프로필 {args.profiles}개를 만드는 중...")
+        build_v6(old, args.profiles, args.users, args.seed)
+        before = measure(old, args.users, args.samples, args.seed)
+
+        new = os.path.join(tmp, "v7.db")
+        shutil.copy(old, new)
+        conn = sqlite3.connect(new)
+        started = time.perf_counter()
+        migrations.migrate(conn)
+        migrate_seconds = time.perf_counter() - started
+        conn.close()
+        after = measure(new, args.users, args.samples, args.seed)
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    result = {
+        "profiles": args.profiles,
+        "codec": ProfileCodec().codec,
+        "before": before,
+        "after": after,
+        "migrate_seconds": round(migrate_seconds, 2),
+        "size_ratio": round(after["file_bytes"] / before["file_bytes"], 3),
+    }
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+"""오프라인 부하 테스트 / 벤치마크.
+
+디스코드와 Gemini에 접속하지 않고, 가짜 Interaction/Message와 로컬 Gemini 대역으로
+N명의 사용자가 동시에 M턴 대화한 뒤 프로필을 생성하고 저장하는 시나리오를 돌립니다.
+결과는 JSON 파일로 저장되어 커밋 간 성능 변화를 비교할 수 있습니다.
+
+    python -m bench.run --users 50 --turns 8 --output bench_results.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+from discord.ext import commands
+
+from bot import intents, setup_bot_state, start_services, stop_services
+from scheduler import GeminiScheduler
+from cogs.char_creator import CharCreator
+from cogs.profile_manager import ProfileManager
+from cogs.ui_elements import SaveProfileModal
+from bench.fakes import FakeUser, FakeDMChannel, FakeIncomingMessage, FakeInteraction
+from bench.stub_gemini import StubConfig, StubFactory
+from metrics import LoopLagMonitor
+
+try:
+    import resource
+except ImportError: # Windows
+    resource = None
+
+def percentiles(samples: list) -> dict:
+    """p50/p95/p99/max를 밀리초 단위로 계산합니다."""
+    if not samples:
+        return {"count": 0}
+    ordered = sorted(samples)
+
+    def pick(p):
+        return ordered[min(len(ordered) - 1, max(0, round(p / 100 * len(ordered)) - 1))] * 1000
+
+    return {
+        "count": len(ordered),
+        "p50_ms": round(pick(50), 3),
+        "p95_ms": round(pick(95), 3),
+        "p99_ms": round(pick(99), 3),
+        "max_ms": round(ordered[-1] * 1000, 3),
+    }
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux는 KB, macOS는 바이트 단위입니다.
+    return round(rss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True, stderr=subprocess.DEVNULL).strip()
+    except Exception:
+        return None
+
+class Workload:
+    def __init__(self, bot, creator: CharCreator, args):
+        self.bot = bot
+        self.creator = creator
+        self.args = args
+        self.samples = {name: [] for name in ("start", "on_message", "chat_turn", "time_to_first_token", "generate", "save_profile")}
+        self._waiters = {}
+        # 스케줄러가 호출하는 처리기를 감싸 응답이 끝난 시점을 알 수 있게 합니다.
+        self._wrap("_reply")
+        self._wrap("_generate_profiles")
+
+    def _wrap(self, name: str):
+        original = getattr(self.creator, name)
+
+        async def wrapped(user_id, items):
+            try:
+                await original(user_id, items)
+            finally:
+                waiter = self._waiters.pop(user_id, None)
+                if waiter is not None and not waiter.done():
+                    waiter.set_result(None)
+
+        setattr(self.creator, name, wrapped)
+
+    def _expect(self, user_id: int) -> asyncio.Future:
+        future = asyncio.get_running_loop().create_future()
+        self._waiters[user_id] = future
+        return future
+
+    async def user(self, user_id: int):
+        args = self.args
+        rng = random.Random(user_id)
+        user = FakeUser(user_id)
+        channel = FakeDMChannel(user)
+        creator = self.creator
+        await asyncio.sleep(rng.uniform(0, args.ramp_up))
+
+        started = time.perf_counter()
+        await creator.start.callback(creator, FakeInteraction(self.bot, user, channel), args.worldview)
+        self.samples["start"].append(time.perf_counter() - started)
+
+        for turn in range(args.turns):
+            await asyncio.sleep(rng.uniform(0, args.think_time))
+            message = FakeIncomingMessage(user, channel, f"{turn}번째 설정: " + "검은 머리의 검사, " * rng.randint(1, 20))
+            done = self._expect(user_id)
+            events_before = len(channel.events)
+            started = time.perf_counter()
+            await creator.on_message(message)
+            self.samples["on_message"].append(time.perf_counter() - started)
+            await done
+            self.samples["chat_turn"].append(time.perf_counter() - started)
+            if len(channel.events) > events_before:
+                self.samples["time_to_first_token"].append(channel.events[events_before][0] - started)
+
+        interaction = FakeInteraction(self.bot, user, channel)
+        done = self._expect(user_id)
+        started = time.perf_counter()
+        await creator.generate.callback(creator, interaction)
+        await done
+        self.samples["generate"].append(time.perf_counter() - started)
+
+        modal = SaveProfileModal()
+        modal.character_name._value = f"캐릭터{user_id}"
+        started = time.perf_counter()
+        await modal.on_submit(FakeInteraction(self.bot, user, channel))
+        self.samples["save_profile"].append(time.perf_counter() - started)
+
+async def run(args) -> dict:
+    stub = StubConfig(latency=args.latency, first_token=args.first_token, response_tokens=args.response_tokens,
+                      error_rate=args.error_rate, seed=args.seed)
+    with tempfile.TemporaryDirectory() as tmp:
+        bot = commands.Bot(command_prefix="/", intents=intents)
+        setup_bot_state(bot, db_path=os.path.join(tmp, "bench.db"), model_factory=StubFactory(stub),
+                        state_backend=args.state_backend)
+        bot.scheduler = GeminiScheduler(max_concurrency=args.concurrency, base_delay=0.05)
+        bot._connection.user = FakeUser(1, "bench-bot")
+        bot.metrics_port = 0
+        await start_services(bot)
+        creator = CharCreator(bot)
+        await bot.add_cog(creator)
+        await bot.add_cog(ProfileManager(bot))
+
+        workload = Workload(bot, creator, args)
+        lag = LoopLagMonitor(interval=0.01, keep_samples=True)
+        lag.start()
+        ops_before = bot.db.operations
+        started = time.perf_counter()
+        await asyncio.gather(*(workload.user(100 + i) for i in range(args.users)))
+        elapsed = time.perf_counter() - started
+        lag.stop()
+        db_ops = bot.db.operations - ops_before
+        scheduler_stats = bot.scheduler.stats()
+        await stop_services(bot)
+
+    return {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": {key: value for key, value in vars(args).items() if key != "output"},
+        "duration_s": round(elapsed, 3),
+        "latency": {name: percentiles(samples) for name, samples in workload.samples.items()},
+        "event_loop_lag": percentiles(lag.samples),
+        "db_ops": db_ops,
+        "db_ops_per_sec": round(db_ops / elapsed, 1) if elapsed else None,
+        "peak_rss_mb": peak_rss_mb(),
+        "gemini_calls": stub.calls,
+        "prompt_tokens": stub.prompt_tokens,
+        "scheduler": scheduler_stats,
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="캐릭터 봇 오프라인 벤치마크")
+    parser.add_argument("--users", type=int, default=20, help="동시에 대화하는 사용자 수")
+    parser.add_argument("--turns", type=int, default=5, help="사용자당 대화 턴 수")
+    parser.add_argument("--worldview", default="세계관1")
+    parser.add_argument("--think-time", type=float, default=0.2, help="턴 사이 최대 대기 시간(초)")
+    parser.add_argument("--ramp-up", type=float, default=1.0, help="사용자 시작 시각을 흩뿌릴 구간(초)")
+    parser.add_argument("--concurrency", type=int, default=4, help="Gemini 동시 호출 제한")
+    parser.add_argument("--latency", type=float, default=0.8, help="대역 Gemini 응답 시간(초)")
+    parser.add_argument("--first-token", type=float, default=0.3, help="대역 Gemini 첫 청크 시간(초)")
+    parser.add_argument("--response-tokens", type=int, default=300)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="429 오류를 낼 확률")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--state-backend", default="", help='공유 상태 저장소 ("sqlite", "redis://..."), 비우면 프로세스 전용')
+    parser.add_argument("--output", default="bench_results.json")
+    args = parser.parse_args(argv)
+
+    result = asyncio.run(run(args))
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+
+    for name, stats in result["latency"].items():
+        if stats["count"]:
+            print(f"{name:>20}: p50 {stats['p50_ms']:9.1f}ms  p95 {stats['p95_ms']:9.1f}ms  p99 {stats['p99_ms']:9.1f}ms")
+    lag = result["event_loop_lag"]
+    print(f"{'event_loop_lag':>20}: p50 {lag['p50_ms']:9.1f}ms  p99 {lag['p99_ms']:9.1f}ms  max {lag['max_ms']:9.1f}ms")
+    print(f"DB {result['db_ops_per_sec']} ops/s, peak RSS {result['peak_rss_mb']} MB, Gemini 호출 {result['gemini_calls']}회")
+    print(f"결과를 {args.output}에 저장했습니다.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""generate_content_async를 흉내 내는 로컬 Gemini 대역.
+
+ModelRegistry의 factory로 넘기면 실제 API 대신 설정한 지연 시간과 토큰 수로 응답합니다.
+"""
+import asyncio
+import random
+from types import SimpleNamespace
+
+class StubError(Exception):
+    """google.api_core 예외처럼 HTTP 상태 코드를 가진 오류"""
+
+    def __init__(self, code: int):
+        super().__init__(f"stub error {code}")
+        self.code = code
+
+class StubConfig:
+    def __init__(self, latency: float = 0.8, jitter: float = 0.3, first_token: float = 0.3,
+                 response_tokens: int = 300, chunk_tokens: int = 20, error_rate: float = 0.0, seed: int = 0):
+        self.latency = latency # 전체 응답에 걸리는 평균 시간(초)
+        self.jitter = jitter # 지연 시간의 상대적 흔들림 (0.3이면 ±30%)
+        self.first_token = first_token # 스트리밍 첫 청크까지의 시간(초)
+        self.response_tokens = response_tokens
+        self.chunk_tokens = chunk_tokens
+        self.error_rate = error_rate # 요청을 열 때 429를 낼 확률
+        self.random = random.Random(seed)
+        self.calls = 0
+        self.prompt_tokens = 0
+
+    def _latency(self, base: float) -> float:
+        return max(0.0, base * (1 + self.random.uniform(-self.jitter, self.jitter)))
+
+def _count_tokens(contents) -> int:
+    if isinstance(contents, str):
+        return len(contents) // 2 + 1
+    return sum(len("".join(m["parts"])) // 2 + 1 for m in contents)
+
+def _words(n: int) -> list:
+    # 한 토큰을 한글 두 글자 정도로 봅니다.
+    return ["가나" for _ in range(n)]
+
+class _StreamResponse:
+    def __init__(self, config: StubConfig, tokens: int, prompt_tokens: int):
+        self.config = config
+        self.tokens = tokens
+        self.usage_metadata = SimpleNamespace(prompt_token_count=prompt_tokens, candidates_token_count=tokens)
+
+    async def __aiter__(self):
+        config = self.config
+        chunks = max(1, self.tokens // config.chunk_tokens)
+        await asyncio.sleep(config._latency(config.first_token))
+        rest = max(0.0, config.latency - config.first_token) / chunks
+        for i in range(chunks):
+            if i:
+                await asyncio.sleep(config._latency(rest))
+            yield SimpleNamespace(text=" ".join(_words(config.chunk_tokens)) + " ")
+
+class StubModel:
+    def __init__(self, config: StubConfig, model_name: str, system_instruction: str = None):
+        self.config = config
+        self.model_name = model_name
+        self.system_instruction = system_instruction
+
+    async def generate_content_async(self, contents, stream: bool = False, **kwargs):
+        config = self.config
+        config.calls += 1
+        prompt_tokens = _count_tokens(contents) + _count_tokens(self.system_instruction or "")
+        config.prompt_tokens += prompt_tokens
+        if config.error_rate and config.random.random() < config.error_rate:
+            await asyncio.sleep(0.05)
+            raise StubError(429)
+        tokens = config.response_tokens
+        if stream:
+            return _StreamResponse(config, tokens, prompt_tokens)
+        await asyncio.sleep(config._latency(config.latency))
+        return SimpleNamespace(
+            text=" ".join(_words(tokens)),
+            usage_metadata=SimpleNamespace(prompt_token_count=prompt_tokens, candidates_token_count=tokens),
+        )
+
+class StubFactory:
+    """ModelRegistry(factory=...)에 넘길 수 있는 GenerativeModel 대역 생성기"""
+
+    def __init__(self, config: StubConfig):
+        self.config = config
+
+    def __call__(self, model_name: str, system_instruction: str = None):
+        return StubModel(self.config, model_name, system_instruction)
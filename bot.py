@@ -1,58 +1,159 @@
+from startup import StartupReport, sync_commands_if_changed # 시작 시간 측정을 위해 가장 먼저 import합니다.
 import discord
 from discord.ext import commands
 import os
 from dotenv import load_dotenv
-import google.generativeai as genai
 import asyncio
+from database import Database, DB_FILE
+from worldviews import WorldviewCatalog
+from model_registry import ModelRegistry
+from scheduler import GeminiScheduler
+from session_store import SessionStore
+from prefix_index import CharacterNameIndex
+from generation_cache import GenerationCache
+from model_router import ModelRouter
+from state_backend import create_backend
+from metrics import InstrumentedTree, LoopLagMonitor, STARTUP_PHASES, register_bot_collectors, start_metrics_server
 
 # .env 파일에서 환경 변수 로드
 load_dotenv()
 DISCORD_TOKEN = os.getenv("DISCORD_TOKEN")
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-
-# Gemini API 설정
-genai.configure(api_key=GEMINI_API_KEY)
+STREAM_REPLIES = os.getenv("STREAM_REPLIES", "true").lower() != "false"
+GEMINI_MAX_CONCURRENCY = int(os.getenv("GEMINI_MAX_CONCURRENCY", "4"))
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9108")) # 0이면 /metrics 엔드포인트를 열지 않습니다.
+# 여러 프로세스가 세션을 공유할 저장소: 비우면 프로세스 전용, "sqlite" 또는 "redis://host:6379/0"
+STATE_BACKEND = os.getenv("STATE_BACKEND", "")
+# true면 커맨드 정의가 그대로여도 시작할 때 한 번 동기화합니다.
+FORCE_COMMAND_SYNC = os.getenv("FORCE_COMMAND_SYNC", "false").lower() == "true"
 
 # 봇 인텐트 설정
 intents = discord.Intents.default()
 intents.message_content = True
 
-# 봇 객체 생성
-bot = commands.Bot(command_prefix='/', intents=intents)
-bot.last_generated_profiles = {} # key: user_id, value: {worldview_name, profile_data}
-bot.persistent_views_added = False
-
-@bot.event
-async def on_ready():
-    """봇이 준비되었을 때 실행됩니다."""
-    print(f'{bot.user.name}이(가) 성공적으로 로그인했습니다!')
-    print(f'봇 ID: {bot.user.id}')
-    try:
-        synced = await bot.tree.sync()
-        print(f"{len(synced)}개의 슬래시 커맨드를 동기화했습니다.")
-    except Exception as e:
-        print(f"커맨드 동기화 중 오류 발생: {e}")
-
-async def load_cogs():
-    """cogs 폴더에서 모든 cog를 로드합니다."""
-    cogs_path = './cogs'
-    for filename in os.listdir(cogs_path):
-        if filename.endswith('.py') and filename != 'ui_elements.py':
+def setup_bot_state(bot: commands.Bot, db_path: str = DB_FILE, model_factory=None, state_backend: str = None):
+    """봇이 공유하는 저장소와 서비스 객체를 붙입니다."""
+    bot.persistent_views_added = False
+    bot.stream_replies = STREAM_REPLIES # Gemini 응답을 스트리밍으로 점진 표시할지 여부
+    bot.db = Database(db_path) # 모든 cog가 공유하는 비동기 DB 저장소
+    # 프로세스 간 공유 저장소 (None이면 이 프로세스만 상태를 가짐)
+    bot.state = create_backend(STATE_BACKEND if state_backend is None else state_backend, bot.db)
+    bot.worldviews = WorldviewCatalog(bot.db, backend=bot.state) # 메모리에 올려둔 세계관 카탈로그
+    bot.character_names = CharacterNameIndex(bot.db, backend=bot.state) # 자동완성용 사용자별 캐릭터 이름 인덱스
+    # 세계관별 시스템 지침과 GenerativeModel 캐시 (Gemini SDK는 첫 호출 때 불러옵니다)
+    bot.models = ModelRegistry(bot.worldviews, factory=model_factory, api_key=GEMINI_API_KEY)
+    bot.router = ModelRouter() # 호출 종류와 최근 지연 시간에 따라 모델을 고르는 라우터
+    # 같은 요청의 Gemini 응답을 재사용하는 캐시. SQLite 공유 모드에서는 DB 파일의 캐시 테이블을 그대로 함께 씁니다.
+    cache_backend = bot.state if bot.state is not None and not bot.state.shares_database else None
+    bot.generation_cache = GenerationCache(bot.db, backend=cache_backend)
+    bot.scheduler = GeminiScheduler(max_concurrency=GEMINI_MAX_CONCURRENCY) # 사용자별 직렬화 + 전역 동시 호출 제한
+    # 오래 쓰이지 않거나 너무 많아진 항목은 SQLite로 내리는 저장소 (재시작 후에도 이어서 사용 가능)
+    bot.sessions = SessionStore(bot.db, "session", ttl=30 * 60, backend=bot.state) # key: user_id, value: 대화 세션
+    bot.last_generated_profiles = SessionStore(bot.db, "profile", ttl=60 * 60, backend=bot.state) # key: user_id, value: {worldview_name, profile_data}
+    bot.metrics_port = METRICS_PORT
+    bot.metrics_server = None
+    bot.loop_lag = LoopLagMonitor() # 이벤트 루프 지연 측정
+    register_bot_collectors(bot)
+
+async def start_services(bot: commands.Bot):
+    """DB를 준비하고 캐시와 백그라운드 작업을 시작합니다."""
+    await bot.db.connect()
+    await bot.worldviews.load()
+    await bot.generation_cache.start()
+    await bot.sessions.start()
+    await bot.last_generated_profiles.start()
+    bot.loop_lag.start()
+    if bot.metrics_port:
+        try:
+            bot.metrics_server = await start_metrics_server(port=bot.metrics_port)
+        except OSError as e:
+            print(f"지표 엔드포인트를 여는 중 오류 발생: {e}")
+
+async def stop_services(bot: commands.Bot):
+    """남은 상태를 디스크에 내리고 DB를 닫습니다."""
+    bot.loop_lag.stop()
+    if bot.metrics_server is not None:
+        bot.metrics_server.close()
+        await bot.metrics_server.wait_closed()
+    await bot.scheduler.close()
+    await bot.sessions.close()
+    await bot.last_generated_profiles.close()
+    if bot.state is not None:
+        await bot.state.close()
+    await bot.db.close()
+
+def create_bot(bot_cls=commands.Bot, state_backend: str = None, **kwargs) -> commands.Bot:
+    """봇 객체를 만들고 상태와 이벤트 처리기를 붙입니다. 클러스터 모드에서는 AutoShardedBot을 넘깁니다."""
+    startup = StartupReport()
+    startup.mark("imports")
+    bot = bot_cls(command_prefix='/', intents=intents, tree_cls=InstrumentedTree, **kwargs)
+    setup_bot_state(bot, state_backend=state_backend)
+    bot.startup = startup
+    bot.sync_commands = True # 여러 프로세스로 띄울 때는 한 프로세스만 동기화합니다.
+    startup.mark("setup")
+
+    @bot.event
+    async def on_ready():
+        """봇이 준비되었을 때 실행됩니다. 게이트웨이에 다시 접속할 때도 호출됩니다."""
+        if bot.startup.ready_at is not None:
+            return # 재접속: 커맨드 동기화와 준비 작업은 프로세스당 한 번만 합니다.
+        bot.startup.ready()
+        print(f'{bot.user.name}이(가) 성공적으로 로그인했습니다!')
+        print(f'봇 ID: {bot.user.id}')
+        print(bot.startup.render())
+        for phase, seconds in bot.startup.phases:
+            STARTUP_PHASES.labels(phase).set(seconds)
+        # 요청을 받기 시작한 뒤 Gemini SDK를 다른 스레드에서 미리 불러옵니다.
+        asyncio.get_running_loop().run_in_executor(None, bot.models.preload)
+        if bot.sync_commands:
             try:
-                await bot.load_extension(f'cogs.{filename[:-3]}')
-                print(f'{filename}을(를) 로드했습니다.')
+                if FORCE_COMMAND_SYNC:
+                    await bot.tree.sync()
+                    print("슬래시 커맨드를 강제로 동기화했습니다.")
+                else:
+                    await sync_commands_if_changed(bot)
             except Exception as e:
-                print(f'{filename}을(를) 로드하는 중 오류가 발생했습니다: {e}')
+                print(f"커맨드 동기화 중 오류 발생: {e}")
+
+    @bot.event
+    async def on_app_command_completion(interaction: discord.Interaction, command):
+        """정상 종료된 슬래시 커맨드의 처리 시간을 기록합니다."""
+        InstrumentedTree.observe(interaction, "ok")
+
+    return bot
+
+async def load_cogs(bot: commands.Bot):
+    """cogs 폴더의 모든 cog를 동시에 로드합니다."""
+    cogs_path = './cogs'
+    filenames = sorted(f for f in os.listdir(cogs_path) if f.endswith('.py') and f != 'ui_elements.py')
+    results = await asyncio.gather(
+        *(bot.load_extension(f'cogs.{filename[:-3]}') for filename in filenames), return_exceptions=True
+    )
+    for filename, result in zip(filenames, results):
+        if isinstance(result, Exception):
+            print(f'{filename}을(를) 로드하는 중 오류가 발생했습니다: {result}')
+        else:
+            print(f'{filename}을(를) 로드했습니다.')
+
+async def run_bot(bot: commands.Bot):
+    """서비스를 시작하고 디스코드에 접속합니다. 종료될 때 상태를 정리합니다."""
+    async with bot:
+        await start_services(bot)
+        bot.startup.mark("services")
+        await load_cogs(bot)
+        bot.startup.mark("cogs")
+        try:
+            await bot.start(DISCORD_TOKEN)
+        finally:
+            await stop_services(bot)
 
 async def main():
     """메인 함수"""
-    async with bot:
-        await load_cogs()
-        await bot.start(DISCORD_TOKEN)
+    await run_bot(create_bot())
 
 if __name__ == '__main__':
     # asyncio.run()은 Windows에서 가끔 문제를 일으킬 수 있으므로,
     # 이벤트 루프 정책을 설정하여 해결합니다.
     if os.name == 'nt': # 'nt'는 Windows를 의미합니다.
         asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
-    asyncio.run(main())
\ No newline at end of file
+    asyncio.run(main())
@@ -0,0 +1,106 @@
+"""여러 프로세스에 게이트웨이 샤드를 나눠 봇을 띄우는 런처.
+
+각 워커 프로세스는 AutoShardedBot으로 연속된 샤드 구간을 맡습니다.
+세션과 임시 프로필은 STATE_BACKEND(기본값 sqlite, 또는 redis://...)에
+저장되므로 사용자의 메시지가 어느 샤드로 들어와도 같은 세션을 이어갑니다.
+
+    python cluster.py --processes 4             # 샤드 수는 디스코드 권장값 사용
+    python cluster.py --processes 2 --shards 8
+"""
+import argparse
+import asyncio
+import math
+import multiprocessing
+import os
+import time
+
+def shard_ranges(shard_count: int, processes: int) -> list:
+    """샤드 0..shard_count-1을 processes개의 연속 구간으로 고르게 나눕니다."""
+    processes = max(1, min(processes, shard_count))
+    size, extra = divmod(shard_count, processes)
+    ranges, start = [], 0
+    for i in range(processes):
+        end = start + size + (1 if i < extra else 0)
+        ranges.append(list(range(start, end)))
+        start = end
+    return ranges
+
+async def gateway_info(token: str):
+    """디스코드가 권장하는 샤드 수와 동시에 접속할 수 있는 샤드 수를 가져옵니다."""
+    from discord.http import HTTPClient
+    http = HTTPClient(asyncio.get_running_loop())
+    try:
+        await http.static_login(token)
+        shards, _, limit = await http.get_bot_gateway()
+        return shards, limit.get("max_concurrency", 1)
+    finally:
+        await http.close()
+
+def worker(index: int, shard_ids: list, shard_count: int, state_backend: str):
+    """워커 프로세스 진입점. 맡은 샤드만 접속하는 AutoShardedBot을 실행합니다."""
+    from discord.ext import commands
+    import bot as bot_module
+
+    if os.name == 'nt':
+        asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
+    bot = bot_module.create_bot(commands.AutoShardedBot, state_backend=state_backend,
+                                shard_ids=shard_ids, shard_count=shard_count)
+    bot.sync_commands = index == 0 # 커맨드 동기화는 첫 워커만 합니다.
+    if bot.metrics_port:
+        bot.metrics_port += index # 워커마다 다른 포트로 /metrics를 엽니다.
+    print(f"워커 {index}: 샤드 {shard_ids[0]}~{shard_ids[-1]} / {shard_count}")
+    asyncio.run(bot_module.run_bot(bot))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="샤드를 여러 프로세스로 나눠 봇을 실행합니다.")
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1, help="워커 프로세스 수")
+    parser.add_argument("--shards", type=int, default=None, help="전체 샤드 수 (기본값: 디스코드 권장값)")
+    parser.add_argument("--state-backend", default=os.getenv("STATE_BACKEND") or "sqlite",
+                        help='공유 상태 저장소: "sqlite" 또는 "redis://host:6379/0"')
+    parser.add_argument("--restart-delay", type=float, default=5.0, help="비정상 종료된 워커를 다시 띄우기 전 대기 시간(초)")
+    args = parser.parse_args(argv)
+
+    from bot import DISCORD_TOKEN
+    shard_count, max_concurrency = args.shards, 1
+    if shard_count is None:
+        shard_count, max_concurrency = asyncio.run(gateway_info(DISCORD_TOKEN))
+    ranges = shard_ranges(shard_count, args.processes)
+
+    # 디스코드는 5초마다 max_concurrency개의 샤드만 접속을 허용하므로 워커 시작 시각을 벌려 둡니다.
+    stagger = [math.ceil(len(r) / max_concurrency) * 5 for r in ranges]
+    ctx = multiprocessing.get_context("spawn")
+    processes = {}
+
+    def spawn(index):
+        process = ctx.Process(target=worker, args=(index, ranges[index], shard_count, args.state_backend),
+                              name=f"bot-worker-{index}")
+        process.start()
+        processes[index] = process
+
+    try:
+        for index in range(len(ranges)):
+            spawn(index)
+            if index < len(ranges) - 1:
+                time.sleep(stagger[index])
+        while processes:
+            time.sleep(1)
+            for index, process in list(processes.items()):
+                if process.is_alive():
+                    continue
+                if process.exitcode == 0:
+                    del processes[index]
+                    continue
+                print(f"워커 {index}가 종료되었습니다 (코드 {process.exitcode}). {args.restart_delay:.0f}초 뒤 다시 시작합니다.")
+                time.sleep(args.restart_delay)
+                spawn(index)
+    except KeyboardInterrupt:
+        print("클러스터를 종료합니다.")
+    finally:
+        for process in processes.values():
+            if process.is_alive():
+                process.terminate()
+        for process in processes.values():
+            process.join(timeout=30)
+
+if __name__ == '__main__':
+    main()
@@ -1,191 +1,246 @@
+import time
+from functools import partial
 import discord
 from discord.ext import commands
 from discord import app_commands
-import google.generativeai as genai
-import sqlite3
-import os
 from .ui_elements import SaveProfileView
-
-# 대화 세션을 저장할 딕셔너리
-# key: user_id, value: {'worldview': str, 'messages': list}
-active_sessions = {}
+from conversation import ConversationContext, new_session
+from generation_cache import cache_key
+from streaming import generate_text, ChannelStreamRenderer, EmbedStreamRenderer
+from metrics import LISTENER_LATENCY, CHAT_TURN_LATENCY, TIME_TO_FIRST_TOKEN
+
+# 자주 기록하는 지표는 레이블 조회 없이 바로 쓰도록 미리 꺼내 둡니다.
+ON_MESSAGE_LATENCY = LISTENER_LATENCY.labels("on_message")
+CHAT_TTFT = TIME_TO_FIRST_TOKEN.labels("chat")
+PROFILE_TTFT = TIME_TO_FIRST_TOKEN.labels("profile")
+
+async def respond(interaction: discord.Interaction, content: str):
+    """defer 여부와 관계없이 본인에게만 보이는 응답을 보냅니다."""
+    if interaction.response.is_done():
+        await interaction.followup.send(content, ephemeral=True)
+    else:
+        await interaction.response.send_message(content, ephemeral=True)
 
 class CharCreator(commands.Cog):
     def __init__(self, bot: commands.Bot):
         self.bot = bot
-        self.db_file = os.path.join("data", "profiles.db")
-
-    def get_worldviews(self):
-        """데이터베이스에서 세계관 목록을 가져옵니다."""
-        conn = sqlite3.connect(self.db_file)
-        cursor = conn.cursor()
-        cursor.execute("SELECT name FROM worldviews")
-        worldviews = [row[0] for row in cursor.fetchall()]
-        conn.close()
-        return worldviews
+        # 대화 세션 저장소 (key: user_id, value: {'worldview', 'messages', 'summary', 'summarized'})
+        self.sessions = bot.sessions
+        self.worldviews = bot.worldviews
+        self.models = bot.models
+        self.scheduler = bot.scheduler
+        self.cache = bot.generation_cache
+        self.router = bot.router
+        self.context = ConversationContext(bot.models, bot.scheduler, bot.router)
 
     @app_commands.command(name="start", description="캐릭터 생성을 시작합니다. 세계관을 선택해주세요.")
     @app_commands.describe(worldview="캐릭터를 생성할 세계관을 선택하세요.")
     async def start(self, interaction: discord.Interaction, worldview: str):
         """캐릭터 생성 세션을 시작하는 명령어"""
-        worldviews = self.get_worldviews()
-        if worldview not in worldviews:
-            await interaction.response.send_message(f"'{worldview}'는 유효한 세계관이 아닙니다. 다음 중에서 선택해주세요: {', '.join(worldviews)}", ephemeral=True)
+        if worldview not in self.worldviews:
+            await interaction.response.send_message(f"'{worldview}'는 유효한 세계관이 아닙니다. 다음 중에서 선택해주세요: {', '.join(self.worldviews.names())}", ephemeral=True)
             return
 
         user_id = interaction.user.id
-        if user_id in active_sessions:
-            await interaction.response.send_message("이미 진행 중인 캐릭터 생성 세션이 있습니다. 새로 시작하려면 먼저 `/quit`을 입력해주세요.", ephemeral=True)
-            return
+        if self.sessions.backend is not None:
+            # 공유 모드의 lock은 진행 중인 응답이 끝날 때까지 기다릴 수 있으므로 먼저 응답 시간을 확보합니다.
+            await interaction.response.defer(ephemeral=True)
+        try:
+            # 확인과 저장 사이에 다른 프로세스가 세션을 바꾸지 않도록 lock 안에서 처리합니다.
+            async with self.sessions.lock(user_id):
+                if await self.sessions.get(user_id) is not None:
+                    content = "이미 진행 중인 캐릭터 생성 세션이 있습니다. 새로 시작하려면 먼저 `/quit`을 입력해주세요."
+                else:
+                    # 세션 시작
+                    await self.sessions.set(user_id, new_session(worldview))
+                    content = f"'{worldview}' 세계관으로 캐릭터 생성을 시작합니다! 어떤 캐릭터를 만들고 싶으신가요? 자유롭게 이야기해주세요."
+        except Exception as e:
+            print(f"세션을 시작하는 중 오류 발생: {e}")
+            content = "죄송합니다, 세션을 시작하는 중 오류가 발생했습니다. 잠시 후 다시 시도해주세요."
+        await respond(interaction, content)
 
-        # 세션 시작
-        active_sessions[user_id] = {
-            "worldview": worldview,
-            "messages": []
-        }
-        
-        await interaction.response.send_message(f"'{worldview}' 세계관으로 캐릭터 생성을 시작합니다! 어떤 캐릭터를 만들고 싶으신가요? 자유롭게 이야기해주세요.", ephemeral=True)
+    @start.autocomplete("worldview")
+    async def worldview_autocomplete(self, interaction: discord.Interaction, current: str):
+        return [app_commands.Choice(name=name[:100], value=name) for name in self.worldviews.search(current)]
 
     @app_commands.command(name="generate", description="현재 대화 내용으로 캐릭터 프로필을 생성합니다.")
-    async def generate(self, interaction: discord.Interaction):
+    @app_commands.describe(fresh="같은 대화로 만든 프로필이 있어도 새로 생성합니다.")
+    async def generate(self, interaction: discord.Interaction, fresh: bool = False):
         """대화 내용을 바탕으로 캐릭터 프로필을 생성합니다."""
         user_id = interaction.user.id
-        if user_id not in active_sessions:
+        session = await self.sessions.get(user_id)
+        if session is None:
             await interaction.response.send_message("시작된 캐릭터 생성 세션이 없습니다. 먼저 `/start`를 이용해 대화를 시작해주세요.", ephemeral=True)
             return
 
-        session = active_sessions[user_id]
         if not session['messages']:
             await interaction.response.send_message("프로필을 생성하기에는 대화 내용이 너무 적습니다. 캐릭터에 대해 더 이야기해주세요.", ephemeral=True)
             return
 
         await interaction.response.defer(ephemeral=True) # 응답 시간을 확보합니다.
+        # 진행 중인 대화 응답이 끝난 뒤에 생성되도록 스케줄러에 맡깁니다.
+        self.scheduler.submit(user_id, (interaction, fresh), self._generate_profiles)
 
-        try:
-            # 시스템 지침: 최종 프로필 생성을 위한 상세 지시
-            system_instruction = f"""You are a creative novelist. Based on the entire following conversation, generate a detailed character profile for the '{{session['worldview']}}' universe.
-The profile should be well-structured and ready to be used in a story. Organize the information clearly.
-
-The final output should be a comprehensive profile that includes, but is not limited to, the following sections:
-- **Name:**
-- **Appearance:**
-- **Personality:**
-- **Abilities/Skills:**
-- **Backstory:**
-- **Equipment/Items:**
-
-Synthesize all the details provided by the user and your creative suggestions into a coherent and compelling character sheet. The tone should be descriptive and engaging, suitable for a novel."""
-            
-            model = genai.GenerativeModel(
-                'gemini-2.5-pro',
-                system_instruction=system_instruction
-            )
-            
-            # 봇의 첫 프롬프트를 포함한 전체 대화 내역 구성
-            initial_bot_prompt = {"role": "model", "parts": ["어떤 캐릭터를 만들고 싶으신가요? 자유롭게 이야기해주세요."]}
-            full_history = [initial_bot_prompt] + session['messages']
-
-            response = await model.generate_content_async(full_history)
-            
-            # 생성된 프로필을 보기 좋은 임베드로 만듭니다.
-            embed = discord.Embed(
-                title="✨ 캐릭터 프로필 생성 완료!",
-                description=response.text,
-                color=discord.Color.gold()
-            )
-            embed.set_footer(text=f"{interaction.user.display_name}님의 캐릭터")
-
-            # 생성된 프로필을 봇의 전역 변수에 저장
-            self.bot.last_generated_profiles[user_id] = {
-                "worldview_name": session['worldview'],
-                "profile_data": response.text
-            }
-            
-            await interaction.followup.send(embed=embed, view=SaveProfileView()) # 저장 버튼이 있는 View 추가
-
-            # 프로필 생성 후 세션 종료
-            del active_sessions[user_id]
+    async def _generate_profiles(self, user_id: int, items: list):
+        """스케줄러가 호출하는 프로필 생성 처리기."""
+        for interaction, fresh in items:
+            await self._generate_profile(user_id, interaction, fresh)
 
+    async def _generate_profile(self, user_id: int, interaction: discord.Interaction, fresh: bool = False):
+        try:
+            # 여러 프로세스로 띄운 경우에도 한 사용자의 작업은 한 곳에서만 처리합니다.
+            async with self.sessions.lock(user_id):
+                await self._generate_profile_locked(user_id, interaction, fresh)
         except Exception as e:
+            # lease를 얻지 못했거나 저장소를 읽지 못한 경우도 포함해, defer한 응답은 꼭 마무리합니다.
             print(f"프로필 생성 중 오류 발생: {e}")
-            await interaction.followup.send("죄송합니다, 프로필을 생성하는 중 오류가 발생했습니다. 잠시 후 다시 시도해주세요.")
+            await interaction.followup.send("죄송합니다, 프로필을 생성하는 중 오류가 발생했습니다. 잠시 후 다시 시도해주세요.", ephemeral=True)
+
+    async def _generate_profile_locked(self, user_id: int, interaction: discord.Interaction, fresh: bool):
+        session = await self.sessions.get(user_id)
+        if session is None: # 대기하는 동안 세션이 종료된 경우
+            await interaction.followup.send("시작된 캐릭터 생성 세션이 없습니다. 먼저 `/start`를 이용해 대화를 시작해주세요.", ephemeral=True)
+            return
+        await self.worldviews.refresh() # 다른 프로세스에서 수정한 세계관 설명을 반영합니다.
+
+        # 세계관별로 미리 만들어 둔 지침과 캐시된 모델을 사용합니다.
+        # 최종 프로필은 품질이 높은 모델을 우선으로, 느리거나 할당량을 넘으면 대체 모델을 씁니다.
+        route = self.router.choose("profile")
+        model = self.models.profile_model(session['worldview'], route.model)
+        
+        # 최종 프로필은 요약 없이 전체 대화 내역을 사용합니다.
+        full_history = self.context.full_history(session)
+
+        # 생성되는 프로필을 임베드에 점진적으로 표시합니다. 완료되면 저장 버튼이 있는 View가 붙습니다.
+        renderer = EmbedStreamRenderer(
+            interaction,
+            title="✨ 캐릭터 프로필 생성 완료!",
+            color=discord.Color.gold(),
+            footer=f"{interaction.user.display_name}님의 캐릭터",
+            view=SaveProfileView()
+        )
+        # 같은 대화로 이미 생성한 프로필은 캐시에서 바로 보여줍니다.
+        key = cache_key(model.model_name, self.models.profile_instruction(session['worldview']), full_history)
+        chunks = self.cache.stream(key, model.model_name, lambda: self.router.track(route.model, generate_text(
+            model, full_history, stream=self.bot.stream_replies, retry=self.scheduler.call_with_retry)), fresh=fresh)
+        profile_data = await renderer.render(chunks)
+        PROFILE_TTFT.observe(renderer.time_to_first_token)
+
+        # 생성된 프로필을 봇의 전역 변수에 저장
+        await self.bot.last_generated_profiles.set(user_id, {
+            "worldview_name": session['worldview'],
+            "profile_data": profile_data
+        })
+
+        # 프로필 생성 후 세션 종료 (그사이 새로 시작한 세션은 남겨 둡니다)
+        current = await self.sessions.get(user_id)
+        if current is not None and current.get("id") == session.get("id"):
+            await self.sessions.pop(user_id)
+        self.context.cancel(user_id)
 
 
     @app_commands.command(name="quit", description="진행 중인 캐릭터 생성을 종료합니다.")
     async def quit(self, interaction: discord.Interaction):
         """캐릭터 생성 세션을 종료하는 명령어"""
         user_id = interaction.user.id
-        if user_id in active_sessions:
-            del active_sessions[user_id]
-            await interaction.response.send_message("캐릭터 생성이 종료되었습니다. 또 이용해주셔서 감사합니다!", ephemeral=True)
-        else:
-            await interaction.response.send_message("시작된 캐릭터 생성 세션이 없습니다.", ephemeral=True)
+        if self.sessions.backend is not None:
+            await interaction.response.defer(ephemeral=True) # lock을 기다리는 동안 응답 시간을 확보합니다.
+        try:
+            async with self.sessions.lock(user_id):
+                if await self.sessions.pop(user_id) is not None:
+                    self.context.cancel(user_id)
+                    content = "캐릭터 생성이 종료되었습니다. 또 이용해주셔서 감사합니다!"
+                else:
+                    content = "시작된 캐릭터 생성 세션이 없습니다."
+        except Exception as e:
+            print(f"세션을 종료하는 중 오류 발생: {e}")
+            content = "죄송합니다, 세션을 종료하는 중 오류가 발생했습니다. 잠시 후 다시 시도해주세요."
+        await respond(interaction, content)
 
     @commands.Cog.listener()
     async def on_message(self, message: discord.Message):
         """사용자 메시지를 감지하고 대화를 이어갑니다."""
+        started = time.perf_counter()
+        try:
+            await self._handle_message(message)
+        finally:
+            ON_MESSAGE_LATENCY.observe(time.perf_counter() - started)
+
+    async def _handle_message(self, message: discord.Message):
         # 봇 자신의 메시지, 또는 다른 명령어는 무시
         if message.author == self.bot.user or message.content.startswith('/'):
             return
 
         user_id = message.author.id
-        if user_id in active_sessions:
-            # DM 채널이거나 봇을 멘션한 경우에만 응답
-            if isinstance(message.channel, discord.DMChannel) or self.bot.user.mentioned_in(message):
-                async with message.channel.typing():
-                    session = active_sessions[user_id]
-                    
-                    # 멘션을 제외한 실제 메시지 내용 추출
-                    content = message.content.replace(f'<@!{self.bot.user.id}>', '').replace(f'<@{self.bot.user.id}>', '').strip()
-                    if not content: # 멘션만 있고 내용이 없으면 무시
-                        return
-                    
-                    session['messages'].append({"role": "user", "parts": [content]})
-
-                    # 데이터베이스에서 세계관 설명 가져오기
-                    conn = sqlite3.connect(self.db_file)
-                    cursor = conn.cursor()
-                    cursor.execute("SELECT description FROM worldviews WHERE name = ?", (session['worldview'],))
-                    result = cursor.fetchone()
-                    conn.close()
-                    worldview_desc = result[0] if result else "A generic fantasy world."
-
-                    # Gemini를 위한 시스템 지침 설정
-                    # Gemini를 위한 시스템 지침 설정: 대화형 AI 역할 부여
-                    system_instruction = f"""You are a creative novelist brainstorming for your next project, targeting a male audience in their 20s.
-The story is set within the '{{session['worldview']}}' universe.
-
-Your goal is to collaborate with the user to build a compelling character.
-Base the character's details on the user's input, but be ready to offer creative and inspiring suggestions if they ask for help.
-Your tone should be encouraging and collaborative.
-
-Here is the detailed setting for the world:
----
-{{worldview_desc}}
----
-"""
-                    
-                    try:
-                        model = genai.GenerativeModel(
-                            'gemini-2.5-pro',
-                            system_instruction=system_instruction
-                        )
-                        
-                        # 봇의 첫 프롬프트를 포함한 전체 대화 내역 구성
-                        initial_bot_prompt = {"role": "model", "parts": ["어떤 캐릭터를 만들고 싶으신가요? 자유롭게 이야기해주세요."]}
-                        full_history = [initial_bot_prompt] + session['messages']
-
-                        response = await model.generate_content_async(full_history)
-                        bot_response = response.text
-                        
-                        # 봇의 응답을 세션에 기록
-                        session['messages'].append({"role": "model", "parts": [bot_response]})
-                        
-                        await message.channel.send(bot_response)
-
-                    except Exception as e:
-                        print(f"Gemini API 호출 중 오류 발생: {e}")
-                        await message.channel.send("죄송합니다, 아이디어를 처리하는 중 오류가 발생했습니다. 잠시 후 다시 시도해주세요.")
+        # DM 채널이거나 봇을 멘션한 경우에만 응답
+        if isinstance(message.channel, discord.DMChannel) or self.bot.user.mentioned_in(message):
+            if await self.sessions.get(user_id) is not None:
+                # 멘션을 제외한 실제 메시지 내용 추출
+                content = message.content.replace(f'<@!{self.bot.user.id}>', '').replace(f'<@{self.bot.user.id}>', '').strip()
+                if not content: # 멘션만 있고 내용이 없으면 무시
+                    return
+
+                # 응답을 기다리는 중에 보낸 메시지는 다음 호출 하나로 합쳐집니다.
+                self.scheduler.submit(user_id, (message, content), self._reply)
+
+    async def _reply(self, user_id: int, items: list):
+        """스케줄러가 호출하는 대화 처리기. 밀려 있던 메시지를 한 턴으로 합쳐 응답합니다."""
+        try:
+            async with self.sessions.lock(user_id):
+                await self._reply_locked(user_id, items)
+        except Exception as e:
+            # lease를 얻지 못했거나 저장소를 읽지 못해도 합쳐 둔 메시지가 조용히 사라지지 않도록 알립니다.
+            print(f"Gemini API 호출 중 오류 발생: {e}")
+            await items[-1][0].channel.send("죄송합니다, 아이디어를 처리하는 중 오류가 발생했습니다. 잠시 후 다시 시도해주세요.")
+
+    async def _reply_locked(self, user_id: int, items: list):
+        session = await self.sessions.get(user_id)
+        if session is None: # 대기하는 동안 세션이 종료된 경우
+            return
+        await self.worldviews.refresh() # 다른 프로세스에서 수정한 세계관 설명을 반영합니다.
+
+        started = time.perf_counter()
+        message = items[-1][0]
+        content = "\n".join(content for _, content in items)
+        async with message.channel.typing():
+            session['messages'].append({"role": "user", "parts": [content]})
+
+            # 세계관별로 미리 만들어 둔 지침과 캐시된 모델을 사용합니다.
+            # 대화 턴은 빠른 응답이 중요하므로 chat 등급의 모델을 사용합니다.
+            route = self.router.choose("chat")
+            model = self.models.chat_model(session['worldview'], route.model)
+            
+            # 요약 + 최근 턴으로 토큰 예산 안의 대화 내역 구성
+            history = self.context.build_history(session)
+
+            # 응답이 도착하는 대로 메시지를 수정하며 보여줍니다 (2000자를 넘으면 이어서 전송).
+            renderer = ChannelStreamRenderer(message.channel)
+            key = cache_key(model.model_name, self.models.chat_instruction(session['worldview']), history)
+            chunks = self.cache.stream(key, model.model_name, lambda: self.router.track(route.model, generate_text(
+                model, history, stream=self.bot.stream_replies, retry=self.scheduler.call_with_retry)))
+            bot_response = await renderer.render(chunks)
+            CHAT_TTFT.observe(renderer.time_to_first_token)
+            CHAT_TURN_LATENCY.observe(time.perf_counter() - started)
+            
+            # 봇의 응답을 세션에 기록
+            session['messages'].append({"role": "model", "parts": [bot_response]})
+            # 응답하는 동안 /quit이나 /start로 세션이 바뀌었다면 지난 세션을 되살리지 않습니다.
+            current = await self.sessions.get(user_id)
+            if current is not None and current.get("id") == session.get("id"):
+                await self.sessions.set(user_id, session)
+                self.context.schedule_summary(user_id, session, on_done=partial(self._save_summary, user_id))
+
+
+    async def _save_summary(self, user_id: int, session: dict):
+        """공유 모드에서는 session이 복사본이므로, 새 요약을 최신 세션에 합쳐 저장합니다."""
+        if self.sessions.backend is None:
+            return
+        async with self.sessions.lock(user_id):
+            current = await self.sessions.get(user_id)
+            if current is None or current.get("id") != session.get("id") or current["summarized"] >= session["summarized"]:
+                return
+            current["summary"], current["summarized"] = session["summary"], session["summarized"]
+            await self.sessions.set(user_id, current)
 
 
 async def setup(bot: commands.Bot):
@@ -1,17 +1,18 @@
 import discord
 from discord.ext import commands
 from discord import app_commands
-import sqlite3
-import os
-from .ui_elements import SaveProfileView
+from .ui_elements import SaveProfileView, PageButton, build_page
+from streaming import EMBED_LIMIT, split_text
 
 class ProfileManager(commands.Cog):
     def __init__(self, bot: commands.Bot):
         self.bot = bot
-        self.db_file = os.path.join("data", "profiles.db")
+        self.db = bot.db
+        self.worldviews = bot.worldviews
         # 봇이 재시작되어도 View가 작동하도록 등록
         if not bot.persistent_views_added:
             bot.add_view(SaveProfileView())
+            bot.add_dynamic_items(PageButton)
             bot.persistent_views_added = True
 
     worldview_group = app_commands.Group(name="worldview", description="세계관 프리셋을 관리합니다.")
@@ -19,60 +20,61 @@ class ProfileManager(commands.Cog):
     @worldview_group.command(name="edit", description="기존 세계관의 설명을 수정합니다.")
     @app_commands.describe(name="수정할 세계관 이름", description="새로운 세계관 설명")
     async def worldview_edit(self, interaction: discord.Interaction, name: str, description: str):
-        conn = sqlite3.connect(self.db_file)
-        cursor = conn.cursor()
-        cursor.execute("UPDATE worldviews SET description = ? WHERE name = ?", (description, name))
-        if cursor.rowcount > 0:
-            conn.commit()
+        if await self.worldviews.update_description(name, description):
             await interaction.response.send_message(f"'{name}' 세계관의 설명이 수정되었습니다.", ephemeral=True)
         else:
             await interaction.response.send_message(f"'{name}' 세계관을 찾을 수 없습니다.", ephemeral=True)
-        conn.close()
+
+    @worldview_edit.autocomplete("name")
+    async def worldview_autocomplete(self, interaction: discord.Interaction, current: str):
+        return [app_commands.Choice(name=name[:100], value=name) for name in self.worldviews.search(current)]
 
     @worldview_group.command(name="list", description="저장된 모든 세계관의 목록과 설명을 보여줍니다.")
     async def worldview_list(self, interaction: discord.Interaction):
-        conn = sqlite3.connect(self.db_file)
-        cursor = conn.cursor()
-        cursor.execute("SELECT name, description FROM worldviews ORDER BY id")
-        worldviews = cursor.fetchall()
-        conn.close()
-        if not worldviews:
+        embed, view = await build_page(self.bot, "worldviews", 0, interaction.user.display_name)
+        if embed is None:
             await interaction.response.send_message("저장된 세계관이 없습니다.", ephemeral=True)
             return
-        embed = discord.Embed(title="🌌 세계관 목록", color=discord.Color.purple())
-        for name, desc in worldviews:
-            embed.add_field(name=name, value=desc, inline=False)
-        await interaction.response.send_message(embed=embed, ephemeral=True)
+        await interaction.response.send_message(embed=embed, view=view, ephemeral=True)
 
     @app_commands.command(name="profiles", description="내가 저장한 모든 캐릭터 프로필 목록을 봅니다.")
     async def list_profiles(self, interaction: discord.Interaction):
-        conn = sqlite3.connect(self.db_file)
-        cursor = conn.cursor()
-        cursor.execute("SELECT character_name, worldview_name FROM profiles WHERE user_id = ? ORDER BY id", (interaction.user.id,))
-        profiles = cursor.fetchall()
-        conn.close()
-        if not profiles:
+        embed, view = await build_page(self.bot, "profiles", interaction.user.id, interaction.user.display_name)
+        if embed is None:
             await interaction.response.send_message("저장된 프로필이 없습니다. `/generate`로 프로필을 만들고 저장해보세요.", ephemeral=True)
             return
-        embed = discord.Embed(title=f"👤 {interaction.user.display_name}님의 프로필 목록", color=discord.Color.blue())
-        description = ""
-        for name, worldview in profiles:
-            description += f"**{name}** (세계관: {worldview})\n"
-        embed.description = description
-        await interaction.response.send_message(embed=embed, ephemeral=True)
+        await interaction.response.send_message(embed=embed, view=view, ephemeral=True)
 
     @app_commands.command(name="load", description="저장된 캐릭터 프로필을 불러옵니다.")
     @app_commands.describe(character_name="불러올 캐릭터의 이름을 입력하세요.")
     async def load_profile(self, interaction: discord.Interaction, character_name: str):
-        conn = sqlite3.connect(self.db_file)
-        cursor = conn.cursor()
-        cursor.execute("SELECT profile_data FROM profiles WHERE user_id = ? AND character_name = ?", (interaction.user.id, character_name))
-        profile = cursor.fetchone()
-        conn.close()
-        if not profile:
+        profile_data = await self.db.get_profile_data(interaction.user.id, character_name)
+        if profile_data is None:
             await interaction.response.send_message(f"'{character_name}'(이)라는 이름의 프로필을 찾을 수 없습니다. 이름을 정확히 입력했는지 확인해주세요.", ephemeral=True)
             return
-        embed = discord.Embed(title=f"📜 프로필: {character_name}", description=profile[0], color=discord.Color.green())
+        # 생성할 때처럼 임베드 길이 제한을 넘는 프로필은 이어지는 임베드로 나눠 보냅니다.
+        first, *rest = split_text(profile_data, EMBED_LIMIT)
+        embed = discord.Embed(title=f"📜 프로필: {character_name}", description=first, color=discord.Color.green())
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+        for part in rest:
+            await interaction.followup.send(embed=discord.Embed(description=part, color=discord.Color.green()), ephemeral=True)
+
+    @load_profile.autocomplete("character_name")
+    async def character_name_autocomplete(self, interaction: discord.Interaction, current: str):
+        names = await self.bot.character_names.search(interaction.user.id, current)
+        return [app_commands.Choice(name=name, value=name) for name in names]
+
+    @app_commands.command(name="search", description="내 캐릭터 프로필 내용을 검색합니다.")
+    @app_commands.describe(query="검색할 단어 (여러 단어는 모두 포함된 프로필을 찾습니다)")
+    async def search_profiles(self, interaction: discord.Interaction, query: app_commands.Range[str, 1, 100]):
+        # 검색어는 임베드 제목(256자)과 안내 메시지에 그대로 들어가므로 길이를 제한합니다.
+        results = await self.db.search_profiles(interaction.user.id, query)
+        if not results:
+            await interaction.response.send_message(f"'{query}'에 해당하는 프로필을 찾을 수 없습니다.", ephemeral=True)
+            return
+        embed = discord.Embed(title=f"🔎 '{query}' 검색 결과", color=discord.Color.blue())
+        for name, worldview, snippet in results:
+            embed.add_field(name=f"{name} (세계관: {worldview})", value=snippet[:1024] or "-", inline=False)
         await interaction.response.send_message(embed=embed, ephemeral=True)
 
 async def setup(bot: commands.Bot):
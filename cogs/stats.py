@@ -0,0 +1,69 @@
+import discord
+from discord.ext import commands
+from discord import app_commands
+from metrics import METRICS, COMMAND_LATENCY, GEMINI_LATENCY, GEMINI_ERRORS, DB_LATENCY, LOOP_LAG, TIME_TO_FIRST_TOKEN, MEMORY_RSS, GENERATION_CACHE, MODEL_ROUTES
+
+def _ms(seconds: float) -> str:
+    return f"{seconds * 1000:.0f}ms"
+
+def _latency_lines(metric, limit: int = 10) -> str:
+    """레이블별로 호출 수, p50, p95를 한 줄씩 정리합니다. 호출이 많은 순서로 보여줍니다."""
+    children = sorted(metric.children.items(), key=lambda item: item[1].count, reverse=True)
+    lines = [
+        f"`{'/'.join(map(str, labels)) or '-'}` {child.count}회 · p50 {_ms(child.quantile(0.5))} · p95 {_ms(child.quantile(0.95))}"
+        for labels, child in children[:limit] if child.count
+    ]
+    return "\n".join(lines) or "기록 없음"
+
+def _route_lines(router) -> str:
+    """등급별 모델 목록과 최근 p95, 예산, 대체 모델로 넘어간 횟수를 보여줍니다."""
+    lines = []
+    for tier in router.tiers.values():
+        models = []
+        for model in tier.models:
+            p95 = router.p95(model)
+            models.append(f"{model} ({_ms(p95) if p95 is not None else '-'})")
+        fallbacks = sum(child.value for labels, child in MODEL_ROUTES.children.items()
+                        if labels[0] == tier.name and labels[2] != "primary")
+        lines.append(f"`{tier.name}` 예산 {tier.budget:.0f}s · {' → '.join(models)} · 대체 {fallbacks:.0f}회")
+    if router.recent:
+        _, tier, model, reason = router.recent[-1]
+        lines.append(f"최근 결정: {tier} → {model} ({reason})")
+    return "\n".join(lines)
+
+class Stats(commands.Cog):
+    def __init__(self, bot: commands.Bot):
+        self.bot = bot
+
+    @app_commands.command(name="stats", description="봇의 지연 시간과 자원 사용량 통계를 봅니다. (관리자 전용)")
+    @app_commands.default_permissions(administrator=True)
+    @app_commands.checks.has_permissions(administrator=True)
+    @app_commands.guild_only()
+    async def stats(self, interaction: discord.Interaction):
+        METRICS.collect()
+        scheduler = self.bot.scheduler.stats()
+        lag = LOOP_LAG.children[()]
+        errors = sum(child.value for child in GEMINI_ERRORS.children.values())
+
+        embed = discord.Embed(title="📊 봇 통계", color=discord.Color.dark_teal())
+        embed.add_field(name="슬래시 커맨드", value=_latency_lines(COMMAND_LATENCY), inline=False)
+        embed.add_field(name="Gemini 호출", value=f"{_latency_lines(GEMINI_LATENCY)}\n오류 {errors:.0f}회", inline=False)
+        embed.add_field(name="첫 응답까지", value=_latency_lines(TIME_TO_FIRST_TOKEN), inline=False)
+        embed.add_field(name="DB", value=_latency_lines(DB_LATENCY), inline=False)
+        embed.add_field(name="이벤트 루프 지연", value=f"p99 {_ms(lag.quantile(0.99))}")
+        embed.add_field(name="활성 세션", value=f"{len(self.bot.sessions)}개")
+        embed.add_field(name="메모리", value=f"{MEMORY_RSS.children[()].value / (1024 * 1024):.1f} MB")
+        embed.add_field(name="스케줄러", value=f"대기 {scheduler['queue_depth']} · 실행 {scheduler['running']} · 평균 대기 {_ms(scheduler['avg_wait'])}")
+        cache = {labels[0]: child.value for labels, child in GENERATION_CACHE.children.items()}
+        embed.add_field(name="생성 캐시", value=" · ".join(f"{name} {count:.0f}" for name, count in cache.items()) or "기록 없음")
+        embed.add_field(name="모델 라우팅", value=_route_lines(self.bot.router), inline=False)
+        embed.add_field(name="세계관 캐시 적중률", value=f"{self.bot.worldviews.hit_rate:.1%}")
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+
+    @stats.error
+    async def stats_error(self, interaction: discord.Interaction, error: app_commands.AppCommandError):
+        if isinstance(error, app_commands.CheckFailure):
+            await interaction.response.send_message("관리자만 사용할 수 있는 명령어입니다.", ephemeral=True)
+
+async def setup(bot: commands.Bot):
+    await bot.add_cog(Stats(bot))
@@ -1,6 +1,5 @@
 import discord
 import sqlite3
-import os
 
 class SaveProfileModal(discord.ui.Modal, title="캐릭터 이름 정하기"):
     character_name = discord.ui.TextInput(
@@ -10,42 +9,100 @@ class SaveProfileModal(discord.ui.Modal, title="캐릭터 이름 정하기"):
         max_length=50
     )
 
-    def __init__(self, db_file: str):
-        super().__init__()
-        self.db_file = db_file
-
     async def on_submit(self, interaction: discord.Interaction):
         user_id = interaction.user.id
-        profile_info = interaction.client.last_generated_profiles.get(user_id)
+        profile_info = await interaction.client.last_generated_profiles.get(user_id)
 
         if not profile_info:
             await interaction.response.send_message("저장할 프로필 정보를 찾을 수 없습니다. 다시 생성해주세요.", ephemeral=True)
             return
 
-        conn = sqlite3.connect(self.db_file)
-        cursor = conn.cursor()
         try:
-            cursor.execute(
-                "INSERT INTO profiles (user_id, character_name, profile_data, worldview_name) VALUES (?, ?, ?, ?)",
-                (user_id, self.character_name.value, profile_info['profile_data'], profile_info['worldview_name'])
+            await interaction.client.db.add_profile(
+                user_id, self.character_name.value, profile_info['profile_data'], profile_info['worldview_name']
             )
-            conn.commit()
+            await interaction.client.character_names.add(user_id, self.character_name.value)
             await interaction.response.send_message(f"✅ 캐릭터 '{self.character_name.value}'(이)가 성공적으로 저장되었습니다!", ephemeral=True)
-            if user_id in interaction.client.last_generated_profiles:
-                del interaction.client.last_generated_profiles[user_id]
+            await interaction.client.last_generated_profiles.pop(user_id)
         except sqlite3.IntegrityError:
             await interaction.response.send_message("오류: 이미 같은 이름의 캐릭터가 존재합니다.", ephemeral=True)
         except Exception as e:
             await interaction.response.send_message(f"저장 중 오류가 발생했습니다: {e}", ephemeral=True)
-        finally:
-            conn.close()
 
 class SaveProfileView(discord.ui.View):
     def __init__(self):
         super().__init__(timeout=None)
-        self.db_file = os.path.join("data", "profiles.db")
 
     @discord.ui.button(label="💾 프로필 저장하기", style=discord.ButtonStyle.success, custom_id="save_profile")
     async def save_button(self, interaction: discord.Interaction, button: discord.ui.Button):
-        modal = SaveProfileModal(self.db_file)
-        await interaction.response.send_modal(modal)
\ No newline at end of file
+        modal = SaveProfileModal()
+        await interaction.response.send_modal(modal)
+
+PAGE_SIZES = {"profiles": 10, "worldviews": 5}
+
+async def build_page(client, kind: str, owner_id: int, owner_name: str, cursor: int = 0, forward: bool = True):
+    """한 페이지만 DB에서 읽어 임베드와 페이지 버튼 View를 만듭니다. 항목이 없으면 (None, None)을 반환합니다."""
+    size = PAGE_SIZES[kind]
+    if kind == "profiles":
+        rows, has_more = await client.db.profile_page(owner_id, cursor, forward, size)
+    else:
+        rows, has_more = await client.db.worldview_page(cursor, forward, size)
+    if not rows and cursor:
+        # 그사이 항목이 지워졌다면 첫 페이지로 돌아갑니다.
+        return await build_page(client, kind, owner_id, owner_name)
+    if not rows:
+        return None, None
+
+    if kind == "profiles":
+        embed = discord.Embed(title=f"👤 {owner_name}님의 프로필 목록", color=discord.Color.blue())
+        embed.description = "".join(f"**{name}** (세계관: {worldview})\n" for _, name, worldview in rows)
+    else:
+        embed = discord.Embed(title="🌌 세계관 목록", color=discord.Color.purple())
+        for _, name, desc in rows:
+            embed.add_field(name=name, value=desc[:1024], inline=False)
+
+    # 앞으로 넘겼다면 cursor 이전에, 뒤로 넘겼다면 cursor 이후에 항목이 있습니다.
+    has_prev = has_more if not forward else cursor > 0
+    has_next = has_more if forward else True
+    view = PageView(kind, owner_id, rows[0][0], rows[-1][0], has_prev, has_next)
+    return embed, view
+
+class PageButton(discord.ui.DynamicItem[discord.ui.Button], template=r"page:(?P<kind>profiles|worldviews):(?P<owner>\d+):(?P<direction>prev|next):(?P<cursor>\d+)"):
+    """페이지 상태를 custom_id에 담은 버튼. 봇이 재시작되어도 그대로 동작합니다."""
+
+    def __init__(self, kind: str, owner_id: int, direction: str, cursor: int, disabled: bool = False):
+        super().__init__(discord.ui.Button(
+            label="◀ 이전" if direction == "prev" else "다음 ▶",
+            style=discord.ButtonStyle.secondary,
+            custom_id=f"page:{kind}:{owner_id}:{direction}:{cursor}",
+            disabled=disabled
+        ))
+        self.kind = kind
+        self.owner_id = owner_id
+        self.direction = direction
+        self.cursor = cursor
+
+    @classmethod
+    async def from_custom_id(cls, interaction: discord.Interaction, item: discord.ui.Button, match):
+        return cls(match["kind"], int(match["owner"]), match["direction"], int(match["cursor"]))
+
+    async def callback(self, interaction: discord.Interaction):
+        if self.kind == "profiles" and interaction.user.id != self.owner_id:
+            await interaction.response.send_message("다른 사용자의 프로필 목록은 넘길 수 없습니다.", ephemeral=True)
+            return
+        embed, view = await build_page(
+            interaction.client, self.kind, self.owner_id, interaction.user.display_name,
+            self.cursor, forward=self.direction == "next"
+        )
+        if embed is None:
+            await interaction.response.edit_message(content="표시할 항목이 없습니다.", embed=None, view=None)
+            return
+        await interaction.response.edit_message(embed=embed, view=view)
+
+class PageView(discord.ui.View):
+    """이전/다음 버튼이 있는 페이지 View"""
+
+    def __init__(self, kind: str, owner_id: int, first_id: int, last_id: int, has_prev: bool, has_next: bool):
+        super().__init__(timeout=None)
+        self.add_item(PageButton(kind, owner_id, "prev", first_id, disabled=not has_prev))
+        self.add_item(PageButton(kind, owner_id, "next", last_id, disabled=not has_next))
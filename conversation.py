@@ -0,0 +1,126 @@
+import asyncio
+import time
+import uuid
+from metrics import record_gemini
+
+INITIAL_BOT_MESSAGE = "어떤 캐릭터를 만들고 싶으신가요? 자유롭게 이야기해주세요."
+
+SUMMARY_INSTRUCTION = """You keep a running summary of a collaborative character-building conversation.
+You will receive the current summary (possibly empty) and the next part of the conversation.
+Return an updated summary that merges both.
+
+Keep every concrete fact the user decided or accepted: names, age, appearance, personality, abilities, backstory, relationships, equipment and rejected ideas.
+Drop greetings and small talk. Write in the same language as the conversation. Output only the summary."""
+
+def estimate_tokens(message: dict) -> int:
+    """메시지의 토큰 수를 대략적으로 추정합니다."""
+    # 한글 등 비ASCII 문자는 글자당 1토큰, ASCII는 4글자당 1토큰 정도로 어림잡습니다.
+    text = "".join(message["parts"])
+    non_ascii = sum(1 for ch in text if ord(ch) > 127)
+    return non_ascii + (len(text) - non_ascii) // 4 + 1
+
+def new_session(worldview: str) -> dict:
+    """새 대화 세션을 만듭니다."""
+    return {
+        "id": uuid.uuid4().hex, # 같은 사용자의 이전/다음 세션과 구분하기 위한 값
+        "worldview": worldview,
+        "messages": [],  # 전체 대화 기록 (/generate용)
+        "summary": "",  # messages[:summarized]를 요약한 내용
+        "summarized": 0,
+    }
+
+class ConversationContext:
+    """대화 기록을 토큰 예산 안에서 Gemini에 보낼 수 있도록 관리합니다.
+
+    최근 keep_turns 턴은 그대로 보내고, 그보다 오래된 턴은 턴 사이에
+    백그라운드로 요약에 합쳐 넣습니다. 덕분에 세션이 길어져도 매 턴의
+    프롬프트 크기가 일정하게 유지됩니다.
+    """
+
+    def __init__(self, models, scheduler, router, keep_turns: int = 6, token_budget: int = 6000):
+        self.models = models
+        self.scheduler = scheduler
+        self.router = router # 요약은 summary 등급의 빠른 모델을 사용합니다.
+        self.keep_messages = keep_turns * 2
+        self.token_budget = token_budget
+        self._tasks = {} # key: user_id, value: 진행 중인 요약 Task
+
+    def _window_start(self, session: dict) -> int:
+        """그대로 보낼 최근 메시지들의 시작 인덱스를 계산합니다."""
+        messages = session["messages"]
+        start = session["summarized"]
+        # 요약이 밀려 있더라도 최근 메시지 수와 토큰 예산을 넘지 않도록 자릅니다.
+        start = max(start, len(messages) - self.keep_messages)
+        tokens = sum(estimate_tokens(m) for m in messages[start:])
+        while tokens > self.token_budget and start < len(messages) - 1:
+            tokens -= estimate_tokens(messages[start])
+            start += 1
+        # 첫 모델 메시지 바로 뒤에는 사용자 메시지가 오도록 맞춥니다.
+        while start < len(messages) - 1 and messages[start]["role"] != "user":
+            start += 1
+        return start
+
+    def build_history(self, session: dict) -> list:
+        """요약 + 최근 턴으로 구성된, 크기가 제한된 대화 기록을 만듭니다."""
+        opening = INITIAL_BOT_MESSAGE
+        if session["summary"]:
+            opening += f"\n\n(지금까지 정리된 캐릭터 설정)\n{session['summary']}"
+        return [{"role": "model", "parts": [opening]}] + session["messages"][self._window_start(session):]
+
+    def full_history(self, session: dict) -> list:
+        """요약 없이 전체 대화 기록을 만듭니다. 최종 프로필 생성에 사용합니다."""
+        return [{"role": "model", "parts": [INITIAL_BOT_MESSAGE]}] + session["messages"]
+
+    def schedule_summary(self, user_id: int, session: dict, on_done=None):
+        """최근 창 밖으로 밀려난 턴이 있으면 백그라운드에서 요약에 합칩니다.
+
+        on_done이 주어지면 요약이 끝난 뒤 on_done(session)을 호출합니다.
+        """
+        task = self._tasks.get(user_id)
+        if task is not None and not task.done():
+            return # 다음 턴이 끝난 뒤에 이어서 요약합니다.
+        messages = session["messages"]
+        end = len(messages) - self.keep_messages
+        while end > session["summarized"] and messages[end]["role"] != "user":
+            end -= 1
+        if end <= session["summarized"]:
+            return
+        self._tasks[user_id] = asyncio.create_task(self._summarize(session, end, on_done))
+
+    def cancel(self, user_id: int):
+        """세션이 끝났을 때 진행 중인 요약 작업을 취소합니다."""
+        task = self._tasks.pop(user_id, None)
+        if task is not None:
+            task.cancel()
+
+    async def _summarize(self, session: dict, end: int, on_done=None):
+        start = session["summarized"]
+        transcript = "\n".join(
+            f"{'User' if m['role'] == 'user' else 'Assistant'}: {''.join(m['parts'])}"
+            for m in session["messages"][start:end]
+        )
+        prompt = f"Current summary:\n{session['summary'] or '(empty)'}\n\nNext part of the conversation:\n{transcript}"
+        try:
+            route = self.router.choose("summary")
+            model = self.models.get(route.model, SUMMARY_INSTRUCTION)
+            # 요약도 전역 동시 호출 제한을 따릅니다.
+            async with self.scheduler.slot():
+                started = time.perf_counter()
+                try:
+                    response = await self.scheduler.call_with_retry(lambda: model.generate_content_async(prompt))
+                except Exception as e:
+                    record_gemini(model, time.perf_counter() - started, error=e)
+                    self.router.record_error(route.model, e)
+                    raise
+                elapsed = time.perf_counter() - started
+                record_gemini(model, elapsed, response)
+                self.router.observe(route.model, elapsed)
+            session["summary"] = response.text.strip()
+            session["summarized"] = end
+            if on_done is not None:
+                await on_done(session)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # 요약에 실패해도 대화는 계속됩니다. 다음 턴에 다시 시도합니다.
+            print(f"대화 요약 중 오류 발생: {e}")
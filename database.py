@@ -1,33 +1,69 @@
 import sqlite3
 import os
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from migrations import DICTIONARY_MIN_PROFILES, migrate
+from profile_codec import ProfileCodec, train_dictionary
+from metrics import DB_READ, DB_WRITE
 
 DB_FILE = os.path.join("data", "profiles.db")
 
-def initialize_database():
+# 자주 쓰는 쿼리는 상수로 두어 sqlite3의 statement 캐시가 재사용되도록 합니다.
+SELECT_WORLDVIEW_NAMES = "SELECT name FROM worldviews ORDER BY id"
+SELECT_WORLDVIEWS = "SELECT name, description FROM worldviews ORDER BY id"
+SELECT_WORLDVIEW_DESCRIPTION = "SELECT description FROM worldviews WHERE name = ?"
+UPDATE_WORLDVIEW_DESCRIPTION = "UPDATE worldviews SET description = ? WHERE name = ?"
+# 키셋 페이지네이션: OFFSET 없이 마지막으로 본 id 다음부터 읽으므로 페이지 위치와 무관하게 일정한 비용이 듭니다.
+SELECT_PROFILE_PAGE_NEXT = "SELECT id, character_name, worldview_name FROM profiles WHERE user_id = ? AND id > ? ORDER BY id LIMIT ?"
+SELECT_PROFILE_PAGE_PREV = "SELECT id, character_name, worldview_name FROM profiles WHERE user_id = ? AND id < ? ORDER BY id DESC LIMIT ?"
+SELECT_WORLDVIEW_PAGE_NEXT = "SELECT id, name, description FROM worldviews WHERE id > ? ORDER BY id LIMIT ?"
+SELECT_WORLDVIEW_PAGE_PREV = "SELECT id, name, description FROM worldviews WHERE id < ? ORDER BY id DESC LIMIT ?"
+SELECT_CHARACTER_NAMES = "SELECT character_name FROM profiles WHERE user_id = ?"
+# 프로필 본문은 profile_bodies에 압축되어 있고, /load와 검색 결과에서만 풀어 읽습니다.
+SELECT_PROFILE_BODY = """
+SELECT b.codec, b.dict_id, b.data
+FROM profiles p JOIN profile_bodies b ON b.profile_id = p.id
+WHERE p.user_id = ? AND p.character_name = ?
+"""
+INSERT_PROFILE = "INSERT INTO profiles (user_id, character_name, worldview_name, created_at) VALUES (?, ?, ?, CURRENT_TIMESTAMP)"
+INSERT_PROFILE_BODY = "INSERT INTO profile_bodies (profile_id, codec, dict_id, data) VALUES (?, ?, ?, ?)"
+INSERT_PROFILE_FTS = "INSERT INTO profiles_fts (rowid, character_name, profile_data) VALUES (?, ?, ?)"
+SELECT_DICTIONARIES = "SELECT id, codec, data FROM compression_dicts ORDER BY id"
+INSERT_DICTIONARY = "INSERT INTO compression_dicts (codec, data) VALUES (?, ?)"
+SELECT_BODY_SAMPLES = "SELECT codec, dict_id, data FROM profile_bodies ORDER BY random() LIMIT ?"
+SEARCH_PROFILES = """
+SELECT p.character_name, p.worldview_name, b.codec, b.dict_id, b.data
+FROM profiles_fts
+JOIN profiles p ON p.id = profiles_fts.rowid
+JOIN profile_bodies b ON b.profile_id = p.id
+WHERE profiles_fts MATCH ? AND p.user_id = ?
+ORDER BY bm25(profiles_fts)
+LIMIT ?
+"""
+
+def connect(path: str = DB_FILE, readonly: bool = False) -> sqlite3.Connection:
+    """WAL 모드로 설정된 SQLite 연결을 엽니다."""
+    conn = sqlite3.connect(path, check_same_thread=False, cached_statements=256)
+    conn.execute("PRAGMA busy_timeout = 5000")
+    if readonly:
+        conn.execute("PRAGMA query_only = ON")
+    else:
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = NORMAL")
+    return conn
+
+def initialize_database(conn: sqlite3.Connection = None):
     """데이터베이스와 테이블을 초기화하고, 기본 세계관 프리셋을 추가합니다."""
-    os.makedirs(os.path.dirname(DB_FILE), exist_ok=True)
-    conn = sqlite3.connect(DB_FILE)
+    own_conn = conn is None
+    if own_conn:
+        os.makedirs(os.path.dirname(DB_FILE), exist_ok=True)
+        conn = connect(DB_FILE)
     cursor = conn.cursor()
 
-    # 세계관 테이블 생성
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS worldviews (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        name TEXT NOT NULL UNIQUE,
-        description TEXT NOT NULL
-    )
-    """)
-
-    # 캐릭터 프로필 테이블 생성 (worldview_id 대신 worldview_name 사용)
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS profiles (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        user_id INTEGER NOT NULL,
-        character_name TEXT NOT NULL,
-        profile_data TEXT NOT NULL,
-        worldview_name TEXT
-    )
-    """)
+    # 버전이 매겨진 마이그레이션으로 스키마를 최신 상태로 만듭니다.
+    migrate(conn)
 
     # 세계관 프리셋이 비어있는지 확인
     cursor.execute("SELECT COUNT(*) FROM worldviews")
@@ -43,8 +79,238 @@ def initialize_database():
         cursor.executemany("INSERT INTO worldviews (name, description) VALUES (?, ?)", presets)
 
     conn.commit()
-    conn.close()
+    if own_conn:
+        conn.close()
+
+def fts_query(text: str, max_terms: int = 8) -> str:
+    """사용자 입력을 FTS5 MATCH 식으로 바꿉니다.
+
+    각 단어를 따옴표로 감싸 FTS 문법 오류를 막고, 접두사 검색(*)으로
+    '검사'가 '검사는', '검사의'처럼 조사가 붙은 단어도 찾도록 합니다.
+    """
+    terms = [term.replace('"', '') for term in text.split()][:max_terms]
+    return " ".join(f'"{term}"*' for term in terms if term)
+
+def make_snippet(text: str, query: str, size: int = 24) -> str:
+    """검색어가 처음 나오는 곳 주변 size 단어를 잘라 검색어로 시작하는 단어를 굵게 표시합니다.
+
+    profiles_fts는 원문을 보관하지 않으므로 FTS5의 snippet() 대신 사용합니다.
+    """
+    terms = [term.replace('"', '').casefold() for term in query.split() if term.replace('"', '')]
+    words = text.split()
+    hits = [i for i, word in enumerate(words) if any(word.casefold().lstrip("*#-:([").startswith(t) for t in terms)]
+    start = max(0, (hits[0] if hits else 0) - size // 3)
+    end = min(len(words), start + size)
+    hit_set = set(hits)
+    window = [f"**{words[i]}**" if i in hit_set else words[i] for i in range(start, end)]
+    return ("…" if start > 0 else "") + " ".join(window) + ("…" if end < len(words) else "")
+
+class Database:
+    """이벤트 루프를 막지 않는 비동기 SQLite 저장소.
+
+    쓰기는 전용 writer 스레드 하나가 장기 연결로 직렬 처리하고,
+    읽기는 WAL 모드 덕분에 reader 스레드 풀에서 동시에 수행됩니다.
+    각 스레드는 자신만의 연결을 한 번 열어 계속 재사용합니다.
+    """
+
+    def __init__(self, path: str = DB_FILE, readers: int = 4):
+        self.path = path
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db-writer")
+        self._readers = ThreadPoolExecutor(max_workers=readers, thread_name_prefix="db-reader")
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+        self.operations = 0 # 실행한 쿼리/트랜잭션 수 (벤치마크, 통계용)
+        self.codec = ProfileCodec() # 프로필 본문 압축
+        self._train_after = DICTIONARY_MIN_PROFILES # 사전이 없을 때 이 id를 넘으면 처음 사전을 만듭니다.
+        self._trainer = None
+
+    def _connection(self, readonly: bool) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = connect(self.path, readonly=readonly)
+            self._local.conn = conn
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    def _read(self, fn, *args):
+        return fn(self._connection(readonly=True), *args)
+
+    def _write(self, fn, *args):
+        conn = self._connection(readonly=False)
+        try:
+            result = fn(conn, *args)
+            conn.commit()
+            return result
+        except BaseException:
+            conn.rollback()
+            raise
+
+    async def run_read(self, fn, *args):
+        """reader 스레드에서 fn(conn, *args)를 실행합니다."""
+        self.operations += 1
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        try:
+            return await loop.run_in_executor(self._readers, self._read, fn, *args)
+        finally:
+            DB_READ.observe(time.perf_counter() - started)
+
+    async def run_write(self, fn, *args):
+        """writer 스레드에서 fn(conn, *args)를 하나의 트랜잭션으로 실행합니다."""
+        self.operations += 1
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        try:
+            return await loop.run_in_executor(self._writer, self._write, fn, *args)
+        finally:
+            DB_WRITE.observe(time.perf_counter() - started)
+
+    async def connect(self):
+        """DB 파일을 준비하고 스키마를 초기화합니다."""
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        await self.run_write(initialize_database)
+        await self.run_read(self._load_dictionaries)
+
+    def _load_dictionaries(self, conn: sqlite3.Connection):
+        for dict_id, codec, data in conn.execute(SELECT_DICTIONARIES):
+            self.codec.add_dictionary(dict_id, codec, data)
+
+    def _decompress(self, conn: sqlite3.Connection, codec: str, dict_id, data: bytes) -> str:
+        # 다른 프로세스가 새로 만든 사전으로 압축된 행이면 사전 목록을 다시 읽습니다.
+        if dict_id is not None and not self.codec.has_dictionary(dict_id):
+            self._load_dictionaries(conn)
+        return self.codec.decompress(codec, dict_id, data)
+
+    async def train_profile_dictionary(self, samples: int = 1000) -> bool:
+        """저장된 프로필로 압축 사전을 새로 만들어, 이후 저장하는 본문에 사용합니다."""
+        def read(conn):
+            texts = [self._decompress(conn, *row) for row in conn.execute(SELECT_BODY_SAMPLES, (samples,))]
+            return train_dictionary(texts, self.codec.codec)
+
+        zdict = await self.run_read(read)
+        if not zdict:
+            return False
+        dict_id = await self.insert(INSERT_DICTIONARY, (self.codec.codec, zdict))
+        self.codec.add_dictionary(dict_id, self.codec.codec, zdict)
+        return True
+
+    async def _train_first_dictionary(self):
+        """사전 없이 저장하던 DB에 프로필이 충분히 쌓이면 처음 사전을 만듭니다."""
+        try:
+            await self.run_read(self._load_dictionaries) # 다른 프로세스가 이미 만들었을 수 있습니다.
+            if self.codec.dict_id is None and not await self.train_profile_dictionary():
+                self._train_after *= 2 # 표본이 부족하면 두 배 더 쌓인 뒤 다시 시도합니다.
+        except Exception as e:
+            print(f"압축 사전을 만드는 중 오류 발생: {e}")
+            self._train_after *= 2
+        finally:
+            self._trainer = None
+
+    async def close(self):
+        """모든 스레드 작업을 마치고 연결을 닫습니다."""
+        if self._trainer is not None:
+            await self._trainer
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self._writer.shutdown)
+        await loop.run_in_executor(None, self._readers.shutdown)
+        with self._lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+
+    # --- 범용 헬퍼 ---
+
+    async def fetchone(self, sql: str, params=()):
+        return await self.run_read(lambda conn: conn.execute(sql, params).fetchone())
+
+    async def fetchall(self, sql: str, params=()):
+        return await self.run_read(lambda conn: conn.execute(sql, params).fetchall())
+
+    async def execute(self, sql: str, params=()) -> int:
+        """쓰기 쿼리를 실행하고 영향받은 행 수를 반환합니다."""
+        return await self.run_write(lambda conn: conn.execute(sql, params).rowcount)
+
+    async def insert(self, sql: str, params=()) -> int:
+        """INSERT를 실행하고 새 행의 id를 반환합니다."""
+        return await self.run_write(lambda conn: conn.execute(sql, params).lastrowid)
+
+    async def executemany(self, sql: str, seq_of_params) -> int:
+        return await self.run_write(lambda conn: conn.executemany(sql, seq_of_params).rowcount)
+
+    # --- 세계관 ---
+
+    async def get_worldview_names(self):
+        rows = await self.fetchall(SELECT_WORLDVIEW_NAMES)
+        return [row[0] for row in rows]
+
+    async def get_worldviews(self):
+        return await self.fetchall(SELECT_WORLDVIEWS)
+
+    async def get_worldview_description(self, name: str):
+        row = await self.fetchone(SELECT_WORLDVIEW_DESCRIPTION, (name,))
+        return row[0] if row else None
+
+    async def update_worldview_description(self, name: str, description: str) -> bool:
+        return await self.execute(UPDATE_WORLDVIEW_DESCRIPTION, (description, name)) > 0
+
+    # --- 프로필 ---
+
+    async def _page(self, sql_next: str, sql_prev: str, params: tuple, cursor: int, forward: bool, size: int):
+        """cursor 다음(또는 이전) 페이지를 id 오름차순으로 반환합니다. (rows, 더 있는지 여부)"""
+        rows = await self.fetchall(sql_next if forward else sql_prev, params + (cursor, size + 1))
+        has_more = len(rows) > size
+        rows = rows[:size]
+        if not forward:
+            rows.reverse()
+        return rows, has_more
+
+    async def profile_page(self, user_id: int, cursor: int, forward: bool = True, size: int = 10):
+        return await self._page(SELECT_PROFILE_PAGE_NEXT, SELECT_PROFILE_PAGE_PREV, (user_id,), cursor, forward, size)
+
+    async def worldview_page(self, cursor: int, forward: bool = True, size: int = 5):
+        return await self._page(SELECT_WORLDVIEW_PAGE_NEXT, SELECT_WORLDVIEW_PAGE_PREV, (), cursor, forward, size)
+
+    async def get_character_names(self, user_id: int):
+        rows = await self.fetchall(SELECT_CHARACTER_NAMES, (user_id,))
+        return [row[0] for row in rows]
+
+    async def get_profile_data(self, user_id: int, character_name: str):
+        def read(conn):
+            row = conn.execute(SELECT_PROFILE_BODY, (user_id, character_name)).fetchone()
+            return self._decompress(conn, *row) if row else None
+
+        return await self.run_read(read)
+
+    async def search_profiles(self, user_id: int, query: str, limit: int = 10):
+        """사용자의 프로필을 전문 검색하여 관련도 순으로 (이름, 세계관, 발췌) 목록을 반환합니다."""
+        match = fts_query(query)
+        if not match:
+            return []
+
+        def read(conn):
+            return [
+                (name, worldview, make_snippet(self._decompress(conn, codec, dict_id, data), query))
+                for name, worldview, codec, dict_id, data in conn.execute(SEARCH_PROFILES, (match, user_id, limit))
+            ]
+
+        return await self.run_read(read)
+
+    async def add_profile(self, user_id: int, character_name: str, profile_data: str, worldview_name: str) -> int:
+        """프로필 행, 압축된 본문, 검색 색인을 한 트랜잭션으로 저장합니다. 압축도 쓰기 스레드에서 합니다."""
+        def write(conn):
+            compressed = self.codec.compress(profile_data)
+            profile_id = conn.execute(INSERT_PROFILE, (user_id, character_name, worldview_name)).lastrowid
+            conn.execute(INSERT_PROFILE_BODY, (profile_id,) + compressed)
+            conn.execute(INSERT_PROFILE_FTS, (profile_id, character_name, profile_data))
+            return profile_id
+
+        profile_id = await self.run_write(write)
+        if self.codec.dict_id is None and profile_id >= self._train_after and self._trainer is None:
+            self._trainer = asyncio.create_task(self._train_first_dictionary())
+        return profile_id
 
 if __name__ == '__main__':
     initialize_database()
-    print("Database initialized successfully with 3 worldview presets.")
\ No newline at end of file
+    print("Database initialized successfully with 3 worldview presets.")
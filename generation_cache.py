@@ -0,0 +1,197 @@
+import asyncio
+import hashlib
+import json
+import time
+import unicodedata
+import zlib
+from collections import OrderedDict
+from metrics import GENERATION_CACHE
+
+UPSERT_CACHE = "INSERT OR REPLACE INTO generation_cache (key, model, response, size, created_at, accessed_at) VALUES (?, ?, ?, ?, ?, ?)"
+SELECT_CACHE = "SELECT response, created_at FROM generation_cache WHERE key = ?"
+TOUCH_CACHE = "UPDATE generation_cache SET accessed_at = ? WHERE key = ?"
+DELETE_CACHE = "DELETE FROM generation_cache WHERE key = ?"
+SELECT_CACHE_ENTRY_SIZE = "SELECT size FROM generation_cache WHERE key = ?"
+SELECT_CACHE_SIZE = "SELECT COALESCE(SUM(size), 0) FROM generation_cache"
+SELECT_OLDEST = "SELECT key, size FROM generation_cache ORDER BY accessed_at"
+
+CACHE_MEMORY_HIT = GENERATION_CACHE.labels("memory")
+CACHE_DISK_HIT = GENERATION_CACHE.labels("disk")
+CACHE_SHARED = GENERATION_CACHE.labels("shared")
+CACHE_MISS = GENERATION_CACHE.labels("miss")
+CACHE_BYPASS = GENERATION_CACHE.labels("fresh")
+
+def _canonical(value):
+    """키 계산용으로 문자열을 NFC로 정규화하고 앞뒤 공백을 제거합니다."""
+    if isinstance(value, str):
+        return unicodedata.normalize("NFC", value).strip()
+    if isinstance(value, dict):
+        return {k: _canonical(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_canonical(v) for v in value]
+    return value
+
+def cache_key(model_name: str, system_instruction: str, contents, config: dict = None) -> str:
+    """(모델, 시스템 지침, 대화 내역, 생성 설정)의 SHA-256 해시."""
+    payload = json.dumps(
+        [model_name, _canonical(system_instruction), _canonical(contents), config or {}],
+        ensure_ascii=False, sort_keys=True, separators=(",", ":"),
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class GenerationCache:
+    """Gemini 응답을 내용 주소(해시)로 보관하는 2단 캐시.
+
+    자주 쓰는 응답은 메모리 LRU에, 그 밖의 응답은 SQLite generation_cache
+    테이블에 압축해 두고, 디스크 용량이 max_bytes를 넘으면 가장 오래 쓰이지
+    않은 항목부터 지웁니다. 같은 키로 동시에 들어온 요청은 하나만 Gemini를
+    호출하고 나머지는 그 결과를 기다립니다 (single-flight).
+    backend(Redis 등)를 주면 SQLite 대신 backend를 두 번째 단계로 쓰고,
+    용량 관리는 backend의 만료 시간에 맡깁니다.
+    """
+
+    def __init__(self, db, max_entries: int = 256, max_bytes: int = 64 * 1024 * 1024, ttl: float = 7 * 24 * 3600,
+                 backend=None):
+        self.db = db
+        self.backend = backend
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries = OrderedDict() # key -> 응답 텍스트 (오래된 순)
+        self._inflight = {} # key -> 생성 중인 응답을 기다리는 Future
+        self._bytes = 0 # 디스크에 저장된 압축 응답의 총 크기
+        self._evict_lock = asyncio.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    async def start(self):
+        if self.backend is not None:
+            return
+        self._bytes = (await self.db.fetchone(SELECT_CACHE_SIZE))[0]
+
+    def _remember(self, key: str, text: str):
+        self._entries[key] = text
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def get(self, key: str):
+        """캐시된 응답을 반환합니다. 없으면 None을 반환합니다."""
+        text = self._entries.get(key)
+        if text is not None:
+            self._entries.move_to_end(key)
+            CACHE_MEMORY_HIT.inc()
+            return text
+        if self.backend is not None:
+            data = await self.backend.get("generation", key)
+            if data is None:
+                return None
+            text = zlib.decompress(data).decode("utf-8")
+            self._remember(key, text)
+            CACHE_DISK_HIT.inc()
+            return text
+        row = await self.db.fetchone(SELECT_CACHE, (key,))
+        if row is None:
+            return None
+        if time.time() - row[1] > self.ttl:
+            return None
+        text = zlib.decompress(row[0]).decode("utf-8")
+        await self.db.execute(TOUCH_CACHE, (time.time(), key))
+        self._remember(key, text)
+        CACHE_DISK_HIT.inc()
+        return text
+
+    async def put(self, key: str, model_name: str, text: str):
+        self._remember(key, text)
+        data = zlib.compress(text.encode("utf-8"))
+        if self.backend is not None:
+            await self.backend.set("generation", key, data, self.ttl)
+            return
+        now = time.time()
+
+        def write(conn):
+            row = conn.execute(SELECT_CACHE_ENTRY_SIZE, (key,)).fetchone()
+            conn.execute(UPSERT_CACHE, (key, model_name, data, len(data), now, now))
+            return len(data) - (row[0] if row else 0)
+
+        self._bytes += await self.db.run_write(write)
+        if self._bytes > self.max_bytes:
+            await self.evict()
+
+    async def evict(self):
+        """디스크 사용량이 max_bytes의 90% 아래로 내려갈 때까지 오래된 항목을 지웁니다."""
+        async with self._evict_lock:
+            target = self._bytes - int(self.max_bytes * 0.9)
+            if target <= 0:
+                return
+
+            def write(conn):
+                freed, keys = 0, []
+                for key, size in conn.execute(SELECT_OLDEST):
+                    if freed >= target:
+                        break
+                    freed += size
+                    keys.append((key,))
+                conn.executemany(DELETE_CACHE, keys)
+                return freed
+
+            self._bytes -= await self.db.run_write(write)
+
+    async def stream(self, key: str, model_name: str, produce, fresh: bool = False):
+        """캐시를 거쳐 응답 청크를 돌려주는 비동기 제너레이터.
+
+        캐시에 있으면 전체 텍스트를 한 번에 돌려주고, 없으면 produce()의
+        청크를 그대로 흘려보낸 뒤 완성된 응답을 저장합니다.
+        fresh가 True이면 캐시를 읽지 않고 새로 생성한 응답으로 덮어씁니다.
+        """
+        if fresh:
+            CACHE_BYPASS.inc()
+        else:
+            text = await self.get(key)
+            if text is not None:
+                yield text
+                return
+            inflight = self._inflight.get(key)
+            if inflight is not None:
+                # 먼저 시작한 요청이 실패하거나 취소되면 직접 생성합니다.
+                try:
+                    text = await asyncio.shield(inflight)
+                except asyncio.CancelledError:
+                    if not inflight.cancelled():
+                        raise
+                    text = None
+                except Exception:
+                    text = None
+                if text is not None:
+                    CACHE_SHARED.inc()
+                    yield text
+                    return
+            CACHE_MISS.inc()
+
+        future = asyncio.get_running_loop().create_future()
+        if key not in self._inflight:
+            self._inflight[key] = future
+        parts = []
+        try:
+            async for chunk in produce():
+                parts.append(chunk)
+                yield chunk
+            text = "".join(parts)
+            # 표시가 끝나기 전에 저장해 두어, 그 뒤 단계가 실패해도 재시도 때 캐시를 씁니다.
+            if text.strip():
+                try:
+                    await self.put(key, model_name, text)
+                except Exception as e:
+                    print(f"생성 캐시 저장 중 오류 발생: {e}")
+            future.set_result(text)
+        except BaseException as e:
+            if isinstance(e, Exception):
+                future.set_exception(e)
+                future.exception() # 기다리는 요청이 없어도 경고가 나지 않도록 합니다.
+            else:
+                future.cancel()
+            raise
+        finally:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
@@ -0,0 +1,328 @@
+import asyncio
+import bisect
+import os
+import sys
+import time
+import discord
+from discord import app_commands
+
+try:
+    import resource
+except ImportError: # Windows
+    resource = None
+
+# 초 단위 지연 시간 버킷
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+TOKEN_BUCKETS = (16, 64, 256, 512, 1024, 2048, 4096, 8192, 16384, 32768)
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(names, values, extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+class CounterChild:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0):
+        self.value += amount
+
+class GaugeChild:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def set(self, value: float):
+        self.value = value
+
+class HistogramChild:
+    """버킷 배열을 미리 만들어 두고 observe()에서는 숫자만 더합니다."""
+
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1) # 마지막 칸은 +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        """버킷 경계로 분위수를 어림합니다."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank:
+                return self.bounds[i] if i < len(self.bounds) else self.bounds[-1]
+        return self.bounds[-1]
+
+class Metric:
+    """레이블 조합별 값(child)을 가진 지표. labels()로 얻은 child는 재사용하세요."""
+
+    def __init__(self, kind: str, name: str, help_text: str, labelnames=(), buckets=None):
+        self.kind = kind
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets) if buckets else None
+        self.children = {}
+        if not self.labelnames:
+            self.labels()
+
+    def labels(self, *values):
+        child = self.children.get(values)
+        if child is None:
+            if self.kind == "histogram":
+                child = HistogramChild(self.buckets)
+            elif self.kind == "counter":
+                child = CounterChild()
+            else:
+                child = GaugeChild()
+            self.children[values] = child
+        return child
+
+    # 레이블이 없는 지표는 바로 호출할 수 있습니다.
+    def inc(self, amount: float = 1.0):
+        self.children[()].inc(amount)
+
+    def set(self, value: float):
+        self.children[()].set(value)
+
+    def observe(self, value: float):
+        self.children[()].observe(value)
+
+    def render(self, lines: list):
+        lines.append(f"# HELP {self.name} {self.help}")
+        lines.append(f"# TYPE {self.name} {self.kind}")
+        for values, child in self.children.items():
+            if self.kind == "histogram":
+                cumulative = 0
+                for bound, n in zip(self.buckets + (float("inf"),), child.counts):
+                    cumulative += n
+                    le = 'le="+Inf"' if bound == float("inf") else f'le="{bound}"'
+                    lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, values, le)} {cumulative}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labelnames, values)} {child.sum}")
+                lines.append(f"{self.name}_count{_format_labels(self.labelnames, values)} {child.count}")
+            else:
+                lines.append(f"{self.name}{_format_labels(self.labelnames, values)} {child.value}")
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = []
+        self._collectors = [] # 렌더링 직전에 게이지 값을 채우는 함수들
+
+    def _add(self, metric: Metric) -> Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, help_text, labelnames=()):
+        return self._add(Metric("counter", name, help_text, labelnames))
+
+    def gauge(self, name, help_text, labelnames=()):
+        return self._add(Metric("gauge", name, help_text, labelnames))
+
+    def histogram(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self._add(Metric("histogram", name, help_text, labelnames, buckets))
+
+    def add_collector(self, fn):
+        """렌더링할 때마다 호출되어 게이지를 갱신하는 함수를 등록합니다."""
+        self._collectors.append(fn)
+
+    def collect(self):
+        for fn in self._collectors:
+            try:
+                fn()
+            except Exception as e:
+                print(f"지표 수집 중 오류 발생: {e}")
+
+    def render(self) -> str:
+        """Prometheus 텍스트 형식으로 모든 지표를 출력합니다."""
+        self.collect()
+        lines = []
+        for metric in self._metrics:
+            metric.render(lines)
+        return "\n".join(lines) + "\n"
+
+METRICS = MetricsRegistry()
+
+COMMAND_LATENCY = METRICS.histogram("bot_command_seconds", "Slash command handler latency", ("command", "status"))
+LISTENER_LATENCY = METRICS.histogram("bot_listener_seconds", "Event listener latency", ("listener",))
+CHAT_TURN_LATENCY = METRICS.histogram("bot_chat_turn_seconds", "Time from dispatch to the full chat reply")
+TIME_TO_FIRST_TOKEN = METRICS.histogram("bot_time_to_first_token_seconds", "Time from request to the first visible chunk", ("kind",))
+GEMINI_LATENCY = METRICS.histogram("gemini_request_seconds", "Gemini request duration", ("model", "status"))
+GEMINI_PROMPT_TOKENS = METRICS.histogram("gemini_prompt_tokens", "Prompt tokens per Gemini request", ("model",), TOKEN_BUCKETS)
+GEMINI_RESPONSE_TOKENS = METRICS.histogram("gemini_response_tokens", "Response tokens per Gemini request", ("model",), TOKEN_BUCKETS)
+GEMINI_ERRORS = METRICS.counter("gemini_errors_total", "Gemini errors by exception class", ("model", "error"))
+DB_LATENCY = METRICS.histogram("db_query_seconds", "SQLite operation latency including executor wait", ("kind",))
+LOOP_LAG = METRICS.histogram("event_loop_lag_seconds", "Event loop scheduling delay")
+ACTIVE_SESSIONS = METRICS.gauge("bot_active_sessions", "Sessions held in memory")
+MEMORY_RSS = METRICS.gauge("process_resident_memory_bytes", "Resident memory size")
+SCHEDULER_QUEUE = METRICS.gauge("scheduler_queue_depth", "Gemini jobs waiting in the scheduler")
+SCHEDULER_RUNNING = METRICS.gauge("scheduler_running", "Gemini jobs in flight")
+SCHEDULER_WAIT = METRICS.gauge("scheduler_wait_seconds", "Scheduler wait time", ("stat",))
+GENERATION_CACHE = METRICS.counter("generation_cache_requests_total", "Generation cache lookups by result", ("result",))
+MODEL_ROUTES = METRICS.counter("model_routes_total", "Model routing decisions", ("tier", "model", "reason"))
+MODEL_P95 = METRICS.gauge("model_latency_p95_seconds", "Rolling p95 latency used for routing", ("model",))
+STARTUP_PHASES = METRICS.gauge("bot_startup_phase_seconds", "Time spent in each startup phase", ("phase",))
+WORLDVIEW_CACHE_HIT_RATE = METRICS.gauge("worldview_cache_hit_rate", "Worldview catalog hit rate")
+
+DB_READ = DB_LATENCY.labels("read")
+DB_WRITE = DB_LATENCY.labels("write")
+
+def model_label(model) -> str:
+    return getattr(model, "model_name", "unknown").removeprefix("models/")
+
+def record_gemini(model, seconds: float, response=None, error: Exception = None):
+    """Gemini 호출 하나의 소요 시간(초), 토큰 수, 오류 종류를 기록합니다."""
+    name = model_label(model)
+    GEMINI_LATENCY.labels(name, "error" if error else "ok").observe(seconds)
+    if error is not None:
+        GEMINI_ERRORS.labels(name, type(error).__name__).inc()
+        return
+    usage = getattr(response, "usage_metadata", None)
+    if usage is not None:
+        GEMINI_PROMPT_TOKENS.labels(name).observe(getattr(usage, "prompt_token_count", 0) or 0)
+        GEMINI_RESPONSE_TOKENS.labels(name).observe(getattr(usage, "candidates_token_count", 0) or 0)
+
+class WaitTimer:
+    """Gemini 응답을 기다린 시간만 합산합니다.
+
+    스트리밍 응답을 받는 쪽이 청크 사이에 디스코드로 보내거나 속도 제한으로 쉬는 시간은
+    모델의 지연 시간이 아니므로, 다음 청크를 기다리는 구간만 잽니다.
+    """
+
+    def __init__(self):
+        self.elapsed = 0.0
+
+    async def wait(self, awaitable):
+        started = time.perf_counter()
+        try:
+            return await awaitable
+        finally:
+            self.elapsed += time.perf_counter() - started
+
+    async def wrap(self, chunks):
+        """chunks를 그대로 흘려보내며 각 청크를 기다린 시간을 더합니다."""
+        iterator = chunks.__aiter__()
+        while True:
+            started = time.perf_counter()
+            try:
+                chunk = await iterator.__anext__()
+            except StopAsyncIteration:
+                return
+            finally:
+                self.elapsed += time.perf_counter() - started
+            yield chunk
+
+def current_rss_bytes() -> int:
+    """현재 RSS를 읽습니다. /proc이 없으면 최대 RSS로 대신합니다."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        if resource is None:
+            return 0
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return rss if sys.platform == "darwin" else rss * 1024
+
+def register_bot_collectors(bot):
+    """봇 상태에서 읽어오는 게이지를 등록합니다."""
+    def collect():
+        ACTIVE_SESSIONS.set(len(bot.sessions))
+        MEMORY_RSS.set(current_rss_bytes())
+        stats = bot.scheduler.stats()
+        SCHEDULER_QUEUE.set(stats["queue_depth"])
+        SCHEDULER_RUNNING.set(stats["running"])
+        SCHEDULER_WAIT.labels("avg").set(stats["avg_wait"])
+        SCHEDULER_WAIT.labels("max").set(stats["max_wait"])
+        WORLDVIEW_CACHE_HIT_RATE.set(bot.worldviews.hit_rate)
+    METRICS.add_collector(collect)
+
+class LoopLagMonitor:
+    """interval마다 깨어나 예정보다 늦게 깨어난 시간(이벤트 루프 지연)을 기록합니다."""
+
+    def __init__(self, interval: float = 0.1, keep_samples: bool = False):
+        self.interval = interval
+        self.samples = [] if keep_samples else None
+        self._task = None
+
+    async def _run(self):
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, time.perf_counter() - start - self.interval)
+            LOOP_LAG.observe(lag)
+            if self.samples is not None:
+                self.samples.append(lag)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+class InstrumentedTree(app_commands.CommandTree):
+    """슬래시 커맨드마다 처리 시간을 기록하는 CommandTree"""
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        interaction.extras["started_at"] = time.perf_counter()
+        return True
+
+    @staticmethod
+    def observe(interaction: discord.Interaction, status: str):
+        started = interaction.extras.get("started_at")
+        command = interaction.command
+        if started is not None and command is not None:
+            COMMAND_LATENCY.labels(command.qualified_name, status).observe(time.perf_counter() - started)
+
+    async def on_error(self, interaction: discord.Interaction, error: app_commands.AppCommandError):
+        # 권한 검사 실패는 커맨드의 오류 처리기가 안내하므로 로그를 남기지 않습니다.
+        if isinstance(error, app_commands.CheckFailure):
+            self.observe(interaction, "denied")
+            return
+        self.observe(interaction, "error")
+        await super().on_error(interaction, error)
+
+async def _handle_metrics_request(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    try:
+        request_line = await asyncio.wait_for(reader.readline(), timeout=5)
+        # 나머지 헤더는 읽고 버립니다.
+        while (await asyncio.wait_for(reader.readline(), timeout=5)) not in (b"\r\n", b"\n", b""):
+            pass
+        parts = request_line.decode("latin-1").split()
+        if len(parts) >= 2 and parts[1].split("?")[0] == "/metrics":
+            body, status = METRICS.render().encode("utf-8"), "200 OK"
+        else:
+            body, status = b"not found\n", "404 Not Found"
+        writer.write(
+            f"HTTP/1.1 {status}\r\nContent-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+            f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode("latin-1") + body
+        )
+        await writer.drain()
+    except (asyncio.TimeoutError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+async def start_metrics_server(host: str = "127.0.0.1", port: int = 9108):
+    """/metrics 엔드포인트를 제공하는 작은 HTTP 서버를 시작합니다."""
+    server = await asyncio.start_server(_handle_metrics_request, host, port)
+    print(f"지표 엔드포인트: http://{host}:{port}/metrics")
+    return server
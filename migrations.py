@@ -0,0 +1,209 @@
+import sqlite3
+from profile_codec import ProfileCodec, train_dictionary
+
+# 스키마 변경은 이 파일에 함수로 추가합니다.
+# MIGRATIONS[i]를 적용하면 DB의 PRAGMA user_version이 i + 1이 됩니다.
+# 이미 배포된 마이그레이션은 수정하지 말고, 새 마이그레이션을 뒤에 덧붙이세요.
+
+def _base_tables(conn: sqlite3.Connection):
+    # 세계관 테이블 생성
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS worldviews (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL UNIQUE,
+        description TEXT NOT NULL
+    )
+    """)
+    # 캐릭터 프로필 테이블 생성 (worldview_id 대신 worldview_name 사용)
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS profiles (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        character_name TEXT NOT NULL,
+        profile_data TEXT NOT NULL,
+        worldview_name TEXT
+    )
+    """)
+
+def _session_spill(conn: sqlite3.Connection):
+    # 메모리에서 내려간 세션/임시 프로필을 보관하는 테이블
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS session_spill (
+        namespace TEXT NOT NULL,
+        key INTEGER NOT NULL,
+        data BLOB NOT NULL,
+        updated_at REAL NOT NULL,
+        PRIMARY KEY (namespace, key)
+    ) WITHOUT ROWID
+    """)
+
+def _profile_indexes(conn: sqlite3.Connection):
+    # 유니크 인덱스를 만들기 전에, 이미 쌓인 중복 이름은 뒤에 id를 붙여 구분합니다.
+    conn.execute("""
+    UPDATE profiles SET character_name = character_name || ' (' || id || ')'
+    WHERE id NOT IN (SELECT MIN(id) FROM profiles GROUP BY user_id, character_name)
+    """)
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_profiles_user_name ON profiles (user_id, character_name)")
+    # user_id 인덱스는 rowid(id) 순으로 정렬되므로 /profiles의 ORDER BY id도 정렬 없이 처리됩니다.
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_profiles_user ON profiles (user_id)")
+    # ADD COLUMN에는 CURRENT_TIMESTAMP 기본값을 쓸 수 없어 기존 행은 따로 채웁니다.
+    conn.execute("ALTER TABLE profiles ADD COLUMN created_at TEXT")
+    conn.execute("UPDATE profiles SET created_at = CURRENT_TIMESTAMP")
+
+def _profile_fts(conn: sqlite3.Connection):
+    # profiles를 외부 콘텐츠로 쓰는 FTS5 인덱스와 동기화 트리거
+    conn.execute("""
+    CREATE VIRTUAL TABLE profiles_fts USING fts5(
+        character_name, profile_data,
+        content = 'profiles', content_rowid = 'id', tokenize = 'unicode61'
+    )
+    """)
+    conn.execute("""
+    CREATE TRIGGER profiles_fts_insert AFTER INSERT ON profiles BEGIN
+        INSERT INTO profiles_fts (rowid, character_name, profile_data)
+        VALUES (new.id, new.character_name, new.profile_data);
+    END
+    """)
+    conn.execute("""
+    CREATE TRIGGER profiles_fts_delete AFTER DELETE ON profiles BEGIN
+        INSERT INTO profiles_fts (profiles_fts, rowid, character_name, profile_data)
+        VALUES ('delete', old.id, old.character_name, old.profile_data);
+    END
+    """)
+    conn.execute("""
+    CREATE TRIGGER profiles_fts_update AFTER UPDATE OF character_name, profile_data ON profiles BEGIN
+        INSERT INTO profiles_fts (profiles_fts, rowid, character_name, profile_data)
+        VALUES ('delete', old.id, old.character_name, old.profile_data);
+        INSERT INTO profiles_fts (rowid, character_name, profile_data)
+        VALUES (new.id, new.character_name, new.profile_data);
+    END
+    """)
+    conn.execute("INSERT INTO profiles_fts (profiles_fts) VALUES ('rebuild')")
+
+def _generation_cache(conn: sqlite3.Connection):
+    # Gemini 응답 캐시. 용량을 넘으면 accessed_at이 오래된 항목부터 지웁니다.
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS generation_cache (
+        key TEXT PRIMARY KEY,
+        model TEXT NOT NULL,
+        response BLOB NOT NULL,
+        size INTEGER NOT NULL,
+        created_at REAL NOT NULL,
+        accessed_at REAL NOT NULL
+    ) WITHOUT ROWID
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_generation_cache_accessed ON generation_cache (accessed_at)")
+
+def _shared_state(conn: sqlite3.Connection):
+    # 여러 프로세스로 띄울 때 공유하는 세션 상태와 사용자별 lease
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS shared_state (
+        namespace TEXT NOT NULL,
+        key TEXT NOT NULL,
+        data BLOB NOT NULL,
+        expires_at REAL NOT NULL,
+        PRIMARY KEY (namespace, key)
+    ) WITHOUT ROWID
+    """)
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS leases (
+        name TEXT PRIMARY KEY,
+        owner TEXT NOT NULL,
+        expires_at REAL NOT NULL
+    ) WITHOUT ROWID
+    """)
+
+DICTIONARY_MIN_PROFILES = 200 # 이보다 적으면 사전 없이 압축합니다.
+DICTIONARY_SAMPLES = 1000
+
+def _profile_bodies(conn: sqlite3.Connection):
+    # 프로필 본문을 압축해 별도 테이블로 옮기고, profiles에는 목록에 필요한 좁은 열만 남깁니다.
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS compression_dicts (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        codec TEXT NOT NULL,
+        data BLOB NOT NULL,
+        created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS profile_bodies (
+        profile_id INTEGER PRIMARY KEY REFERENCES profiles (id),
+        codec TEXT NOT NULL,
+        dict_id INTEGER REFERENCES compression_dicts (id),
+        data BLOB NOT NULL
+    )
+    """)
+
+    codec = ProfileCodec()
+    if conn.execute("SELECT COUNT(*) FROM profiles").fetchone()[0] >= DICTIONARY_MIN_PROFILES:
+        samples = [row[0] for row in conn.execute(
+            "SELECT profile_data FROM profiles ORDER BY random() LIMIT ?", (DICTIONARY_SAMPLES,))]
+        zdict = train_dictionary(samples, codec.codec)
+        if zdict:
+            dict_id = conn.execute("INSERT INTO compression_dicts (codec, data) VALUES (?, ?)", (codec.codec, zdict)).lastrowid
+            codec.add_dictionary(dict_id, codec.codec, zdict)
+
+    # 본문은 압축해서 옮기고, 압축이 안 된 원문은 한 번만 읽어 FTS 색인에도 넣습니다.
+    # profiles_fts는 원문을 보관하지 않는(contentless) 테이블로 바꾸고 앱에서 직접 갱신합니다.
+    for trigger in ("profiles_fts_insert", "profiles_fts_delete", "profiles_fts_update"):
+        conn.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+    conn.execute("DROP TABLE IF EXISTS profiles_fts")
+    conn.execute("""
+    CREATE VIRTUAL TABLE profiles_fts USING fts5(
+        character_name, profile_data,
+        content = '', tokenize = 'unicode61'
+    )
+    """)
+    rows = conn.execute("SELECT id, character_name, profile_data FROM profiles ORDER BY id")
+    while True:
+        batch = rows.fetchmany(1000)
+        if not batch:
+            break
+        conn.executemany(
+            "INSERT INTO profile_bodies (profile_id, codec, dict_id, data) VALUES (?, ?, ?, ?)",
+            [(profile_id,) + codec.compress(profile_data) for profile_id, _, profile_data in batch],
+        )
+        conn.executemany(
+            "INSERT INTO profiles_fts (rowid, character_name, profile_data) VALUES (?, ?, ?)", batch
+        )
+    conn.execute("ALTER TABLE profiles DROP COLUMN profile_data")
+
+# 본문이 빠진 만큼 파일을 줄이려면 트랜잭션 밖에서 VACUUM을 해야 합니다.
+_profile_bodies.vacuum = True
+
+MIGRATIONS = [
+    _base_tables,
+    _session_spill,
+    _profile_indexes,
+    _profile_fts,
+    _generation_cache,
+    _shared_state,
+    _profile_bodies,
+]
+
+def schema_version(conn: sqlite3.Connection) -> int:
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+def migrate(conn: sqlite3.Connection) -> int:
+    """아직 적용되지 않은 마이그레이션을 순서대로 하나씩 트랜잭션으로 적용합니다."""
+    if conn.in_transaction:
+        conn.commit()
+    version = schema_version(conn)
+    for target in range(version + 1, len(MIGRATIONS) + 1):
+        # 여러 프로세스가 동시에 시작해도 한 곳에서만 적용되도록 쓰기 잠금을 먼저 잡고 버전을 다시 확인합니다.
+        conn.execute("BEGIN IMMEDIATE")
+        if schema_version(conn) >= target:
+            conn.commit()
+            continue
+        try:
+            MIGRATIONS[target - 1](conn)
+            conn.execute(f"PRAGMA user_version = {target}")
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        print(f"DB 스키마를 버전 {target}(으)로 마이그레이션했습니다.")
+        if getattr(MIGRATIONS[target - 1], "vacuum", False):
+            conn.execute("VACUUM")
+    return schema_version(conn)
@@ -0,0 +1,125 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+CHAT_MODEL = "gemini-2.5-flash"
+PROFILE_MODEL = "gemini-2.5-pro"
+
+# 대화형 AI 역할을 부여하는 시스템 지침
+CHAT_INSTRUCTION_TEMPLATE = """You are a creative novelist brainstorming for your next project, targeting a male audience in their 20s.
+The story is set within the '{worldview}' universe.
+
+Your goal is to collaborate with the user to build a compelling character.
+Base the character's details on the user's input, but be ready to offer creative and inspiring suggestions if they ask for help.
+Your tone should be encouraging and collaborative.
+
+Here is the detailed setting for the world:
+---
+{worldview_desc}
+---
+"""
+
+# 최종 프로필 생성을 위한 상세 지시
+PROFILE_INSTRUCTION_TEMPLATE = """You are a creative novelist. Based on the entire following conversation, generate a detailed character profile for the '{worldview}' universe.
+The profile should be well-structured and ready to be used in a story. Organize the information clearly.
+
+The final output should be a comprehensive profile that includes, but is not limited to, the following sections:
+- **Name:**
+- **Appearance:**
+- **Personality:**
+- **Abilities/Skills:**
+- **Backstory:**
+- **Equipment/Items:**
+
+Synthesize all the details provided by the user and your creative suggestions into a coherent and compelling character sheet. The tone should be descriptive and engaging, suitable for a novel."""
+
+DEFAULT_WORLDVIEW_DESC = "A generic fantasy world."
+
+_genai = None
+_genai_lock = threading.Lock()
+
+def load_genai(api_key: str = None):
+    """google.generativeai는 import가 느리므로 처음 필요할 때 불러오고 설정합니다."""
+    global _genai
+    if _genai is None:
+        with _genai_lock:
+            if _genai is None:
+                import google.generativeai as genai
+                genai.configure(api_key=api_key)
+                _genai = genai
+    return _genai
+
+def instruction_hash(system_instruction: str) -> str:
+    return hashlib.sha256(system_instruction.encode("utf-8")).hexdigest()[:16]
+
+class ModelRegistry:
+    """GenerativeModel 객체와 시스템 지침을 재사용하기 위한 레지스트리.
+
+    시스템 지침은 세계관별로 한 번만 만들고, 모델 객체는
+    (모델 이름, 지침 해시)를 키로 LRU 방식으로 보관합니다.
+    세계관이 수정되면 그 세계관에 묶인 지침과 모델을 비웁니다.
+    """
+
+    def __init__(self, worldviews, max_models: int = 64, factory=None, api_key: str = None):
+        self.worldviews = worldviews
+        self.max_models = max_models
+        self.api_key = api_key
+        self._factory = factory or self._gemini_model
+        self._instructions = {} # key: (template, worldview), value: 완성된 지침
+        self._models = OrderedDict() # key: (model_name, instruction_hash), value: GenerativeModel
+        self._worldview_keys = {} # key: worldview, value: 그 세계관에 묶인 모델 키 집합
+        worldviews.add_listener(lambda name, description: self.invalidate_worldview(name))
+
+    def _gemini_model(self, model_name: str, system_instruction: str = None):
+        return load_genai(self.api_key).GenerativeModel(model_name, system_instruction=system_instruction)
+
+    def preload(self):
+        """첫 요청이 SDK import를 기다리지 않도록 미리 불러옵니다. 준비 완료 뒤 별도 스레드에서 호출합니다."""
+        if self._factory == self._gemini_model:
+            load_genai(self.api_key)
+
+    def _instruction(self, template: str, worldview: str) -> str:
+        key = (template, worldview)
+        instruction = self._instructions.get(key)
+        if instruction is not None:
+            # 지침 캐시가 카탈로그 조회를 대신했으므로 세계관 적중률에도 포함합니다.
+            self.worldviews.record_lookup(worldview in self.worldviews)
+        else:
+            worldview_desc = self.worldviews.get_description(worldview) or DEFAULT_WORLDVIEW_DESC
+            instruction = template.format(worldview=worldview, worldview_desc=worldview_desc)
+            self._instructions[key] = instruction
+        return instruction
+
+    def chat_instruction(self, worldview: str) -> str:
+        return self._instruction(CHAT_INSTRUCTION_TEMPLATE, worldview)
+
+    def profile_instruction(self, worldview: str) -> str:
+        return self._instruction(PROFILE_INSTRUCTION_TEMPLATE, worldview)
+
+    def get(self, model_name: str, system_instruction: str, worldview: str = None):
+        """캐시된 모델을 반환하고, 없으면 새로 만들어 보관합니다."""
+        key = (model_name, instruction_hash(system_instruction))
+        model = self._models.get(key)
+        if model is not None:
+            self._models.move_to_end(key)
+            return model
+        model = self._factory(model_name, system_instruction=system_instruction)
+        self._models[key] = model
+        if worldview is not None:
+            self._worldview_keys.setdefault(worldview, set()).add(key)
+        while len(self._models) > self.max_models:
+            self._models.popitem(last=False)
+        return model
+
+    def chat_model(self, worldview: str, model_name: str = CHAT_MODEL):
+        return self.get(model_name, self.chat_instruction(worldview), worldview)
+
+    def profile_model(self, worldview: str, model_name: str = PROFILE_MODEL):
+        return self.get(model_name, self.profile_instruction(worldview), worldview)
+
+    def invalidate_worldview(self, worldview: str):
+        """세계관에 묶인 지침과 모델 캐시를 비웁니다."""
+        for key in [k for k in self._instructions if k[1] == worldview]:
+            del self._instructions[key]
+        for key in self._worldview_keys.pop(worldview, ()):
+            self._models.pop(key, None)
@@ -0,0 +1,136 @@
+import os
+import time
+from collections import deque
+from dataclasses import dataclass
+from metrics import METRICS, MODEL_ROUTES, MODEL_P95, WaitTimer
+
+# 호출 종류별 기본 모델 (앞쪽이 우선, 뒤쪽이 더 빠른 대체 모델)과 p95 지연 예산(초)
+DEFAULT_TIERS = {
+    "chat": (("gemini-2.5-flash", "gemini-2.5-flash-lite"), 12.0),
+    "summary": (("gemini-2.5-flash-lite", "gemini-2.5-flash"), 20.0),
+    "profile": (("gemini-2.5-pro", "gemini-2.5-flash"), 90.0),
+}
+
+def is_quota_error(error: Exception) -> bool:
+    """429(할당량 초과) 오류인지 확인합니다."""
+    try:
+        return int(getattr(error, "code", None)) == 429
+    except (TypeError, ValueError):
+        return False
+
+@dataclass
+class Tier:
+    name: str
+    models: tuple
+    budget: float # 이 값보다 p95가 느리면 다음 모델로 넘어갑니다.
+
+@dataclass
+class Route:
+    tier: str
+    model: str
+    reason: str # primary, fallback:slow, fallback:cooldown, exhausted
+
+def tiers_from_env(environ=os.environ) -> dict:
+    """MODEL_TIER_<종류>="모델1,모델2", MODEL_BUDGET_<종류>="초" 환경 변수로 기본값을 덮어씁니다."""
+    tiers = {}
+    for name, (models, budget) in DEFAULT_TIERS.items():
+        override = environ.get(f"MODEL_TIER_{name.upper()}")
+        if override:
+            models = tuple(m.strip() for m in override.split(",") if m.strip())
+        budget = float(environ.get(f"MODEL_BUDGET_{name.upper()}", budget))
+        tiers[name] = Tier(name, models, budget)
+    return tiers
+
+class ModelStats:
+    """모델 하나의 최근 응답 시간과 할당량 오류 대기 상태."""
+
+    def __init__(self, window: int, window_seconds: float):
+        self.samples = deque(maxlen=window) # (관측 시각, 소요 시간)
+        self.window_seconds = window_seconds
+        self.cooldown_until = 0.0
+
+    def p95(self, now: float, min_samples: int):
+        # 오래된 관측은 버려서, 느려서 밀려났던 모델도 시간이 지나면 다시 시도됩니다.
+        while self.samples and now - self.samples[0][0] > self.window_seconds:
+            self.samples.popleft()
+        if len(self.samples) < min_samples:
+            return None
+        ordered = sorted(duration for _, duration in self.samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+
+class ModelRouter:
+    """호출 종류(chat, summary, profile)마다 사용할 모델을 고르는 라우터.
+
+    각 종류는 우선순위가 있는 모델 목록과 p95 지연 예산을 가집니다.
+    앞쪽 모델의 최근 p95가 예산을 넘거나 할당량 오류로 대기 중이면
+    다음 모델을 고릅니다. 결정은 지표와 최근 기록으로 남겨 /stats에서 확인합니다.
+    """
+
+    def __init__(self, tiers: dict = None, window: int = 200, window_seconds: float = 300,
+                 min_samples: int = 10, cooldown: float = 60, history: int = 50):
+        self.tiers = tiers or tiers_from_env()
+        self.window = window
+        self.window_seconds = window_seconds
+        self.min_samples = min_samples
+        self.cooldown = cooldown
+        self._stats = {} # key: 모델 이름, value: ModelStats
+        self.recent = deque(maxlen=history) # 최근 결정 (시각, tier, model, reason)
+        METRICS.add_collector(self._collect)
+
+    def _model(self, name: str) -> ModelStats:
+        stats = self._stats.get(name)
+        if stats is None:
+            stats = self._stats[name] = ModelStats(self.window, self.window_seconds)
+        return stats
+
+    def p95(self, model: str):
+        return self._model(model).p95(time.monotonic(), self.min_samples)
+
+    def choose(self, tier_name: str) -> Route:
+        tier = self.tiers[tier_name]
+        now = time.monotonic()
+        reason = "primary"
+        for model in tier.models:
+            stats = self._model(model)
+            if stats.cooldown_until > now:
+                reason = "fallback:cooldown"
+                continue
+            p95 = stats.p95(now, self.min_samples)
+            if p95 is not None and p95 > tier.budget:
+                reason = "fallback:slow"
+                continue
+            return self._record(Route(tier_name, model, reason))
+        # 모두 밀려났다면 할당량 대기 중이 아닌 모델을 우선으로, 없으면 마지막 모델을 씁니다.
+        available = [m for m in tier.models if self._model(m).cooldown_until <= now]
+        return self._record(Route(tier_name, (available or tier.models)[-1], "exhausted"))
+
+    def _record(self, route: Route) -> Route:
+        MODEL_ROUTES.labels(route.tier, route.model, route.reason).inc()
+        self.recent.append((time.time(), route.tier, route.model, route.reason))
+        return route
+
+    def observe(self, model: str, seconds: float):
+        self._model(model).samples.append((time.monotonic(), seconds))
+
+    def record_error(self, model: str, error: Exception):
+        if is_quota_error(error):
+            self._model(model).cooldown_until = time.monotonic() + self.cooldown
+            print(f"{model} 모델이 할당량을 초과해 {self.cooldown:.0f}초 동안 대체 모델을 사용합니다.")
+
+    async def track(self, model: str, chunks):
+        """응답 청크를 그대로 흘려보내며 오류와, 청크를 기다린 시간의 합을 기록합니다.
+
+        받는 쪽이 디스코드로 보내는 시간은 빼야 디스코드가 느릴 때 대체 모델로 잘못 넘어가지 않습니다.
+        """
+        timer = WaitTimer()
+        try:
+            async for chunk in timer.wrap(chunks):
+                yield chunk
+        except Exception as e:
+            self.record_error(model, e)
+            raise
+        self.observe(model, timer.elapsed)
+
+    def _collect(self):
+        for model in self._stats:
+            MODEL_P95.labels(model).set(self.p95(model) or 0.0)
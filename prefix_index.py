@@ -0,0 +1,132 @@
+import bisect
+import uuid
+from collections import OrderedDict
+
+# 한글 음절의 초성 (유니코드 순서)
+CHOSEONG = "ㄱㄲㄴㄷㄸㄹㅁㅂㅃㅅㅆㅇㅈㅉㅊㅋㅌㅍㅎ"
+CHOSEONG_SET = set(CHOSEONG)
+HANGUL_START, HANGUL_END = 0xAC00, 0xD7A3
+
+NAMES_NAMESPACE = "names"
+NAMES_STAMP_TTL = 30 * 24 * 3600
+
+def normalize(text: str) -> str:
+    return "".join(text.split()).casefold()
+
+def choseong(text: str) -> str:
+    """한글 음절은 초성으로 바꾸고 나머지 문자는 그대로 둡니다. ('아서 펜' -> 'ㅇㅅㅍ')"""
+    result = []
+    for ch in normalize(text):
+        code = ord(ch)
+        if HANGUL_START <= code <= HANGUL_END:
+            result.append(CHOSEONG[(code - HANGUL_START) // 588])
+        else:
+            result.append(ch)
+    return "".join(result)
+
+def is_choseong_query(query: str) -> bool:
+    return any(ch in CHOSEONG_SET for ch in query)
+
+def matches_choseong(name: str, query: str) -> bool:
+    """초성이 섞인 query가 name의 앞부분과 맞는지 확인합니다. 초성은 음절의 초성과, 나머지는 글자 그대로 비교합니다."""
+    key = normalize(name)
+    if len(query) > len(key):
+        return False
+    for q, ch, cho in zip(query, key, choseong(key)):
+        if q != ch and not (q in CHOSEONG_SET and q == cho):
+            return False
+    return True
+
+class PrefixIndex:
+    """정렬된 배열과 이분 탐색으로 접두사 검색을 하는 인덱스.
+
+    이름 그대로의 키와 초성 키를 따로 정렬해 두어, 'ㅇㅅ'처럼
+    초성만 입력해도 '아서'를 찾을 수 있습니다.
+    """
+
+    def __init__(self, names=()):
+        self._names = set()
+        self._keys = [] # (normalize(name), name)
+        self._choseong_keys = [] # (choseong(name), name)
+        for name in names:
+            self.add(name)
+
+    def __len__(self):
+        return len(self._names)
+
+    def add(self, name: str):
+        if name in self._names:
+            return
+        self._names.add(name)
+        bisect.insort(self._keys, (normalize(name), name))
+        bisect.insort(self._choseong_keys, (choseong(name), name))
+
+    def remove(self, name: str):
+        if name not in self._names:
+            return
+        self._names.discard(name)
+        for keys, key in ((self._keys, normalize(name)), (self._choseong_keys, choseong(name))):
+            i = bisect.bisect_left(keys, (key, name))
+            if i < len(keys) and keys[i] == (key, name):
+                del keys[i]
+
+    @staticmethod
+    def _scan(keys, prefix: str, limit: int, seen: set, out: list, accept=None):
+        i = bisect.bisect_left(keys, (prefix,))
+        while i < len(keys) and len(out) < limit and keys[i][0].startswith(prefix):
+            name = keys[i][1]
+            if name not in seen and (accept is None or accept(name)):
+                seen.add(name)
+                out.append(name)
+            i += 1
+
+    def search(self, query: str, limit: int = 25) -> list:
+        """query로 시작하는 이름을 최대 limit개 반환합니다. 빈 문자열이면 앞에서부터 반환합니다."""
+        out, seen = [], set()
+        prefix = normalize(query)
+        self._scan(self._keys, prefix, limit, seen, out)
+        # 초성이 섞인 입력('ㅇㅅ', '아ㅅ')은 초성 키로 후보를 좁힌 뒤 글자별로 확인합니다.
+        if is_choseong_query(prefix):
+            self._scan(self._choseong_keys, choseong(prefix), limit, seen, out,
+                       accept=lambda name: matches_choseong(name, prefix))
+        return out
+
+class CharacterNameIndex:
+    """사용자별 캐릭터 이름 인덱스.
+
+    처음 자동완성을 요청한 사용자만 DB에서 한 번 읽어오고, 이후에는
+    저장할 때마다 갱신하므로 자동완성에서 DB를 다시 조회하지 않습니다.
+    너무 많은 사용자의 인덱스를 들고 있지 않도록 LRU로 개수를 제한합니다.
+
+    backend를 주면(여러 프로세스 모드) 저장할 때 사용자별 표식을 바꾸고, 조회할 때
+    표식이 읽어올 때와 다르면 다른 프로세스에서 저장한 것이므로 DB에서 다시 읽습니다.
+    """
+
+    def __init__(self, db, max_users: int = 2048, backend=None):
+        self.db = db
+        self.max_users = max_users
+        self.backend = backend
+        self._indexes = OrderedDict() # key: user_id, value: (읽어올 때의 표식, PrefixIndex)
+
+    async def get(self, user_id: int) -> PrefixIndex:
+        stamp = await self.backend.get(NAMES_NAMESPACE, user_id) if self.backend is not None else None
+        entry = self._indexes.get(user_id)
+        if entry is None or entry[0] != stamp:
+            entry = (stamp, PrefixIndex(await self.db.get_character_names(user_id)))
+            self._indexes[user_id] = entry
+            while len(self._indexes) > self.max_users:
+                self._indexes.popitem(last=False)
+        else:
+            self._indexes.move_to_end(user_id)
+        return entry[1]
+
+    async def search(self, user_id: int, query: str, limit: int = 25) -> list:
+        return (await self.get(user_id)).search(query, limit)
+
+    async def add(self, user_id: int, name: str):
+        """아직 읽어오지 않은 사용자라면 다음 조회 때 DB에서 함께 읽히므로 무시합니다."""
+        if self.backend is not None:
+            await self.backend.set(NAMES_NAMESPACE, user_id, uuid.uuid4().hex.encode(), NAMES_STAMP_TTL)
+        entry = self._indexes.get(user_id)
+        if entry is not None:
+            entry[1].add(name)
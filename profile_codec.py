@@ -0,0 +1,102 @@
+import zlib
+from collections import Counter
+
+try:
+    import zstandard
+except ImportError: # 선택 의존성: 없으면 zlib을 사용합니다.
+    zstandard = None
+
+ZLIB_LEVEL = 9
+ZSTD_LEVEL = 12
+# zlib은 32KB 창 안의 문자열만 참조할 수 있으므로 사전도 그 이하로 만듭니다.
+DICT_SIZE = 32 * 1024
+
+def default_codec() -> str:
+    return "zstd" if zstandard is not None else "zlib"
+
+def _require_zstd():
+    if zstandard is None:
+        raise RuntimeError("zstd로 압축된 프로필을 읽으려면 zstandard 패키지를 설치해주세요. (pip install zstandard)")
+
+def train_dictionary(samples: list, codec: str = None, size: int = DICT_SIZE):
+    """기존 프로필들로 압축 사전을 만듭니다. 표본이 부족하면 None을 반환합니다."""
+    codec = codec or default_codec()
+    if codec == "zstd":
+        _require_zstd()
+        try:
+            return zstandard.train_dictionary(size, [s.encode("utf-8") for s in samples]).as_bytes()
+        except zstandard.ZstdError:
+            return None
+    # zlib 사전은 자주 나오는 문자열을 이어 붙인 것입니다. 여러 프로필에 공통으로 나오는
+    # 단어 묶음(1~3단어)을 (등장한 프로필 수 x 길이) 순으로 골라 채웁니다.
+    document_frequency = Counter()
+    for text in samples:
+        words = text.split(" ")
+        grams = set()
+        for n in (1, 2, 3):
+            for i in range(len(words) - n + 1):
+                gram = " ".join(words[i:i + n])
+                if len(gram) >= 4:
+                    grams.add(gram)
+        document_frequency.update(grams)
+    min_count = max(2, len(samples) // 20)
+    candidates = sorted(
+        ((count * len(gram.encode("utf-8")), gram) for gram, count in document_frequency.items() if count >= min_count),
+        reverse=True,
+    )
+    pieces, total = [], 0
+    for _, gram in candidates:
+        data = gram.encode("utf-8")
+        if total + len(data) + 1 > size or any(gram in piece for piece in pieces[-64:]):
+            continue
+        pieces.append(gram)
+        total += len(data) + 1
+    if not pieces:
+        return None
+    # 가까운 위치의 문자열일수록 짧게 부호화되므로, 가장 유용한 조각을 사전 끝에 둡니다.
+    return " ".join(reversed(pieces)).encode("utf-8")
+
+class ProfileCodec:
+    """프로필 본문을 압축/해제합니다.
+
+    사전은 id로 구분해 모두 보관하고, 새로 저장하는 본문에는 가장 최근 사전을 씁니다.
+    각 행에는 압축 방식과 사전 id를 함께 저장하므로 사전을 다시 만들어도
+    예전 행을 그대로 읽을 수 있습니다.
+    """
+
+    def __init__(self, codec: str = None):
+        self.codec = codec or default_codec()
+        self.dict_id = None # 새 본문에 사용할 사전 id
+        self._dicts = {} # key: 사전 id, value: (codec, 사전 바이트)
+
+    def add_dictionary(self, dict_id: int, codec: str, data: bytes):
+        self._dicts[dict_id] = (codec, data)
+        if codec == self.codec and (self.dict_id is None or dict_id > self.dict_id):
+            self.dict_id = dict_id
+
+    def has_dictionary(self, dict_id: int) -> bool:
+        return dict_id in self._dicts
+
+    def compress(self, text: str):
+        """(codec, dict_id, 압축된 바이트)를 반환합니다."""
+        raw = text.encode("utf-8")
+        # 다른 스레드가 add_dictionary()로 바꿀 수 있으므로 한 번만 읽어, 고른 사전과 기록할 id를 맞춥니다.
+        dict_id = self.dict_id
+        zdict = self._dicts[dict_id][1] if dict_id is not None else None
+        if self.codec == "zstd":
+            params = {"dict_data": zstandard.ZstdCompressionDict(zdict)} if zdict else {}
+            return self.codec, dict_id, zstandard.ZstdCompressor(level=ZSTD_LEVEL, **params).compress(raw)
+        if zdict:
+            compressor = zlib.compressobj(ZLIB_LEVEL, zdict=zdict)
+        else:
+            compressor = zlib.compressobj(ZLIB_LEVEL)
+        return self.codec, dict_id, compressor.compress(raw) + compressor.flush()
+
+    def decompress(self, codec: str, dict_id, data: bytes) -> str:
+        zdict = self._dicts[dict_id][1] if dict_id is not None else None
+        if codec == "zstd":
+            _require_zstd()
+            params = {"dict_data": zstandard.ZstdCompressionDict(zdict)} if zdict else {}
+            return zstandard.ZstdDecompressor(**params).decompress(data).decode("utf-8")
+        decompressor = zlib.decompressobj(zdict=zdict) if zdict else zlib.decompressobj()
+        return (decompressor.decompress(data) + decompressor.flush()).decode("utf-8")
@@ -0,0 +1,137 @@
+import asyncio
+import random
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+
+# 재시도할 HTTP 상태 코드 (429: 할당량 초과, 5xx: 일시적인 서버 오류)
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+def is_retryable(error: Exception) -> bool:
+    """google.api_core 예외의 HTTP 상태 코드로 재시도 여부를 판단합니다."""
+    code = getattr(error, "code", None)
+    try:
+        return int(code) in RETRYABLE_STATUS
+    except (TypeError, ValueError):
+        return False
+
+class GeminiScheduler:
+    """Gemini 호출을 사용자 단위로 줄 세우는 전역 스케줄러.
+
+    - 한 사용자의 작업은 한 번에 하나씩만 실행됩니다.
+    - 호출이 진행 중일 때 들어온 같은 종류의 작업은 다음 호출 하나로 합쳐집니다.
+    - 전체 동시 호출 수는 세마포어로 제한됩니다.
+    - 대기 중인 사용자는 라운드 로빈으로 차례를 받습니다.
+    """
+
+    def __init__(self, max_concurrency: int = 4, max_retries: int = 3, base_delay: float = 1.0, max_delay: float = 20.0):
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._batches = {} # key: user_id, value: deque of [handler, [(item, enqueued_at)]]
+        self._ready = deque() # 차례를 기다리는 사용자 (라운드 로빈)
+        self._running = set() # 호출이 진행 중인 사용자
+        self._wakeup = asyncio.Event()
+        self._dispatcher = None
+        # 관측용 통계
+        self.submitted = 0
+        self.coalesced = 0
+        self.completed = 0
+        self.failed = 0
+        self.retries = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def submit(self, user_id: int, item, handler):
+        """작업을 예약합니다. handler(user_id, items)는 합쳐진 작업 목록을 받습니다."""
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.create_task(self._dispatch())
+        self.submitted += 1
+        batches = self._batches.setdefault(user_id, deque())
+        if batches and batches[-1][0] == handler:
+            batches[-1][1].append((item, time.monotonic()))
+            self.coalesced += 1
+        else:
+            batches.append([handler, [(item, time.monotonic())]])
+        if user_id not in self._running and user_id not in self._ready:
+            self._ready.append(user_id)
+            self._wakeup.set()
+
+    async def _dispatch(self):
+        while True:
+            # 할 일이 생긴 뒤에 자리를 잡아야 쉬는 동안 slot()을 쓰는 백그라운드 호출이 자리를 씁니다.
+            # _ready에서 꺼내는 곳은 여기뿐이므로 자리를 기다리는 사이 줄이 비지 않습니다.
+            while not self._ready:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+            await self._semaphore.acquire()
+            user_id = self._ready.popleft()
+            batches = self._batches[user_id]
+            handler, entries = batches.popleft()
+            if not batches:
+                del self._batches[user_id]
+            now = time.monotonic()
+            for _, enqueued_at in entries:
+                wait = now - enqueued_at
+                self.total_wait += wait
+                self.max_wait = max(self.max_wait, wait)
+            self._running.add(user_id)
+            asyncio.create_task(self._run(user_id, handler, [item for item, _ in entries]))
+
+    async def _run(self, user_id: int, handler, items: list):
+        try:
+            await handler(user_id, items)
+            self.completed += 1
+        except Exception as e:
+            self.failed += 1
+            print(f"예약된 작업 처리 중 오류 발생: {e}")
+        finally:
+            self._running.discard(user_id)
+            self._semaphore.release()
+            # 그동안 쌓인 작업이 있으면 줄의 맨 뒤로 다시 섭니다.
+            if user_id in self._batches:
+                self._ready.append(user_id)
+                self._wakeup.set()
+
+    async def call_with_retry(self, fn):
+        """fn()을 호출하고, 429/5xx 오류는 지터를 준 지수 백오프로 재시도합니다."""
+        for attempt in range(self.max_retries + 1):
+            try:
+                return await fn()
+            except Exception as e:
+                if attempt == self.max_retries or not is_retryable(e):
+                    raise
+                self.retries += 1
+                await asyncio.sleep(random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt)))
+
+    @asynccontextmanager
+    async def slot(self):
+        """스케줄러 밖의 백그라운드 호출도 전역 동시 실행 제한을 따르도록 합니다."""
+        async with self._semaphore:
+            yield
+
+    @property
+    def queue_depth(self) -> int:
+        """대기 중인 작업 수."""
+        return sum(len(entries) for batches in self._batches.values() for _, entries in batches)
+
+    def stats(self) -> dict:
+        dispatched = self.submitted - self.queue_depth
+        return {
+            "queued_users": len(self._ready),
+            "queue_depth": self.queue_depth,
+            "running": len(self._running),
+            "submitted": self.submitted,
+            "coalesced": self.coalesced,
+            "completed": self.completed,
+            "failed": self.failed,
+            "retries": self.retries,
+            "avg_wait": self.total_wait / dispatched if dispatched else 0.0,
+            "max_wait": self.max_wait,
+        }
+
+    async def close(self):
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
@@ -0,0 +1,222 @@
+import asyncio
+import json
+import os
+import random
+import time
+import uuid
+import zlib
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+
+UPSERT_SPILL = "INSERT OR REPLACE INTO session_spill (namespace, key, data, updated_at) VALUES (?, ?, ?, ?)"
+SELECT_SPILL_KEYS = "SELECT key FROM session_spill WHERE namespace = ?"
+SELECT_SPILL = "SELECT data FROM session_spill WHERE namespace = ? AND key = ?"
+DELETE_SPILL = "DELETE FROM session_spill WHERE namespace = ? AND key = ?"
+PURGE_SPILL = "DELETE FROM session_spill WHERE updated_at < ?"
+
+def encode(value) -> bytes:
+    return zlib.compress(json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+
+def decode(data: bytes):
+    return json.loads(zlib.decompress(data).decode("utf-8"))
+
+class SessionStore:
+    """메모리 사용량이 제한된 키-값 저장소.
+
+    일정 시간(ttl) 동안 쓰이지 않은 항목과 max_entries를 넘는 오래된 항목은
+    메모리에서 내려 SQLite의 session_spill 테이블로 옮깁니다. 디스크 쓰기는
+    항목마다 하지 않고 버퍼에 모았다가 sweep 주기마다 한 번에 기록합니다.
+    내려간 항목은 다음 get()에서 다시 메모리로 올라오므로, 재시작 후에도
+    세션을 이어갈 수 있습니다.
+
+    backend를 주면 여러 프로세스가 상태를 공유하는 모드로 동작합니다. 이때는
+    메모리에 들고 있지 않고 매번 backend에서 읽고 바로 써서, 어느 프로세스가
+    메시지를 받아도 같은 세션을 이어갑니다. 사용자별 작업은 lock()으로 감쌉니다.
+    """
+
+    def __init__(self, db, namespace: str, ttl: float = 1800, max_entries: int = 5000,
+                 sweep_interval: float = 60, spill_ttl: float = 7 * 24 * 3600, batch_size: int = 256,
+                 backend=None):
+        self.db = db
+        self.backend = backend
+        self.owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}" # lease 소유자 이름
+        self.namespace = namespace
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.sweep_interval = sweep_interval
+        self.spill_ttl = spill_ttl
+        self.batch_size = batch_size
+        self._entries = OrderedDict() # key -> [value, last_access] (오래된 순)
+        self._pending = {} # 아직 기록하지 않은 변경: key -> value (None이면 삭제)
+        self._spilled = set() # 디스크에 내려가 있는 키 (없는 키 조회에 DB를 읽지 않도록)
+        self._sweeper = None
+        self._flush_lock = asyncio.Lock()
+        self._locks = {} # key -> [asyncio.Lock, 기다리거나 잡고 있는 작업 수]
+        self.evictions = 0
+        self.restores = 0
+        self._shared_count = 0 # 공유 모드에서 마지막 sweep 때 센 항목 수
+
+    def __len__(self):
+        """메모리에 있는 항목 수. 공유 모드에서는 모든 프로세스의 항목을 마지막 sweep 때 센 값입니다."""
+        if self.backend is not None:
+            return self._shared_count
+        return len(self._entries)
+
+    async def start(self):
+        """디스크에 남은 키 목록을 읽고, 주기적으로 만료 항목을 정리하는 작업을 시작합니다."""
+        if self.backend is None:
+            rows = await self.db.fetchall(SELECT_SPILL_KEYS, (self.namespace,))
+            self._spilled = {row[0] for row in rows}
+        else:
+            self._shared_count = await self.backend.count(self.namespace)
+        if self._sweeper is None:
+            self._sweeper = asyncio.create_task(self._sweep_loop())
+
+    async def get(self, key, default=None):
+        if self.backend is not None:
+            data = await self.backend.get(self.namespace, key)
+            return default if data is None else decode(data)
+        entry = self._entries.get(key)
+        if entry is not None:
+            entry[1] = time.monotonic()
+            self._entries.move_to_end(key)
+            return entry[0]
+        if key in self._pending:
+            value = self._pending[key]
+            if value is None: # 삭제 예정인 항목
+                return default
+            del self._pending[key]
+        elif key not in self._spilled:
+            return default
+        else:
+            # 기록 중인 배치가 끝난 뒤에 읽어야 방금 내린 항목도 보입니다.
+            async with self._flush_lock:
+                row = await self.db.fetchone(SELECT_SPILL, (self.namespace, key))
+            value = decode(row[0]) if row else None
+            if value is not None:
+                # 메모리로 다시 올렸으므로 디스크 사본은 다음 기록 때 지웁니다.
+                self._pending[key] = None
+        if value is None:
+            return default
+        self.restores += 1
+        self._store(key, value)
+        return value
+
+    async def set(self, key, value):
+        if self.backend is not None:
+            await self.backend.set(self.namespace, key, encode(value), self.spill_ttl)
+            return
+        self._store(key, value)
+
+    def _store(self, key, value):
+        self._entries[key] = [value, time.monotonic()]
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            old_key, (old_value, _) = self._entries.popitem(last=False)
+            self._spill(old_key, old_value)
+
+    async def pop(self, key, default=None):
+        value = await self.get(key)
+        if self.backend is not None:
+            await self.backend.delete(self.namespace, key)
+            return default if value is None else value
+        self._entries.pop(key, None)
+        self._pending[key] = None
+        return default if value is None else value
+
+    def _spill(self, key, value):
+        self._pending[key] = value
+        self.evictions += 1
+        if len(self._pending) >= self.batch_size:
+            asyncio.create_task(self.flush())
+
+    async def sweep(self):
+        """ttl이 지난 항목을 내리고 쌓인 변경을 기록합니다."""
+        if self.backend is not None:
+            await self.backend.purge()
+            self._shared_count = await self.backend.count(self.namespace)
+            return
+        deadline = time.monotonic() - self.ttl
+        while self._entries:
+            key, (value, last_access) = next(iter(self._entries.items()))
+            if last_access > deadline:
+                break
+            del self._entries[key]
+            self._spill(key, value)
+        await self.flush()
+        if await self.db.execute(PURGE_SPILL, (time.time() - self.spill_ttl,)):
+            rows = await self.db.fetchall(SELECT_SPILL_KEYS, (self.namespace,))
+            self._spilled = {row[0] for row in rows}
+
+    async def flush(self):
+        """버퍼에 모인 변경을 한 트랜잭션으로 기록합니다."""
+        async with self._flush_lock:
+            if not self._pending:
+                return
+            pending, self._pending = self._pending, {}
+            now = time.time()
+            upserts = [(self.namespace, k, encode(v), now) for k, v in pending.items() if v is not None]
+            deletes = [(self.namespace, k) for k, v in pending.items() if v is None]
+
+            def write(conn):
+                conn.executemany(UPSERT_SPILL, upserts)
+                conn.executemany(DELETE_SPILL, deletes)
+
+            await self.db.run_write(write)
+            for k, v in pending.items():
+                if v is None:
+                    self._spilled.discard(k)
+                else:
+                    self._spilled.add(k)
+
+    async def _sweep_loop(self):
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            try:
+                await self.sweep()
+            except Exception as e:
+                print(f"세션 정리 중 오류 발생: {e}")
+
+    @asynccontextmanager
+    async def lock(self, key, timeout: float = 60, lease: float = 300):
+        """공유 모드에서 key에 대한 lease를 잡습니다. 다른 프로세스가 같은 사용자를 동시에 처리하지 않도록 합니다.
+
+        lease는 프로세스 단위로 소유하므로, 같은 프로세스의 다른 작업(백그라운드 요약 저장 등)은
+        먼저 key별 asyncio.Lock을 기다립니다. 그래서 한 작업이 끝나기 전에 다른 작업이
+        lease를 풀어 버리는 일이 없습니다.
+        프로세스 전용 모드에서는 스케줄러가 이미 사용자별로 직렬화하므로 아무것도 하지 않습니다.
+        """
+        if self.backend is None:
+            yield
+            return
+        name = f"{self.namespace}:{key}"
+        deadline = time.monotonic() + timeout
+        entry = self._locks.setdefault(key, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            await asyncio.wait_for(entry[0].acquire(), timeout)
+            try:
+                while not await self.backend.acquire(name, self.owner, lease):
+                    if time.monotonic() > deadline:
+                        raise TimeoutError(f"{name} lease를 {timeout:.0f}초 안에 얻지 못했습니다.")
+                    await asyncio.sleep(random.uniform(0.05, 0.2))
+                try:
+                    yield
+                finally:
+                    await self.backend.release(name, self.owner)
+            finally:
+                entry[0].release()
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._locks[key]
+
+    async def close(self):
+        """종료 시 메모리의 모든 항목을 디스크로 내립니다."""
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            self._sweeper = None
+        for key, (value, _) in self._entries.items():
+            self._pending[key] = value
+        self._entries.clear()
+        await self.flush()
@@ -0,0 +1,74 @@
+import hashlib
+import json
+import os
+import time
+
+# 이 모듈을 처음 import한 시점을 프로세스 시작 시각으로 봅니다. (bot.py가 가장 먼저 import합니다.)
+PROCESS_STARTED = time.perf_counter()
+
+COMMAND_HASH_FILE = os.path.join("data", "command_tree.json")
+
+class StartupReport:
+    """시작 단계별 소요 시간을 기록해, 준비 완료까지 어디서 시간이 드는지 보여줍니다."""
+
+    def __init__(self, started: float = PROCESS_STARTED):
+        self.started = started
+        self._last = started
+        self.phases = [] # (단계 이름, 소요 시간)
+        self.ready_at = None
+
+    def mark(self, phase: str):
+        """직전 mark() 이후 지금까지를 phase에 걸린 시간으로 기록합니다."""
+        now = time.perf_counter()
+        self.phases.append((phase, now - self._last))
+        self._last = now
+
+    def ready(self):
+        """준비 완료 시각을 기록합니다. 재접속으로 다시 불려도 처음 한 번만 기록합니다."""
+        if self.ready_at is None:
+            self.mark("gateway")
+            self.ready_at = time.perf_counter()
+
+    @property
+    def total(self) -> float:
+        return (self.ready_at or time.perf_counter()) - self.started
+
+    def render(self) -> str:
+        lines = [f"시작 시간 {self.total:.2f}초"]
+        lines += [f"  {phase:<12} {seconds:7.3f}초" for phase, seconds in self.phases]
+        return "\n".join(lines)
+
+def command_tree_hash(tree) -> str:
+    """동기화될 전역 커맨드 정의 전체의 해시."""
+    payload = sorted((command.to_dict(tree) for command in tree.get_commands()),
+                     key=lambda c: (c.get("type", 1), c["name"]))
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+def _load_hashes(path: str) -> dict:
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+async def sync_commands_if_changed(bot, path: str = COMMAND_HASH_FILE) -> bool:
+    """커맨드 정의가 마지막 동기화 때와 다를 때만 tree.sync()를 호출합니다.
+
+    해시는 애플리케이션 ID별로 path에 저장하며, 동기화에 성공한 뒤에만 갱신합니다.
+    동기화했으면 True를 반환합니다.
+    """
+    digest = command_tree_hash(bot.tree)
+    hashes = _load_hashes(path)
+    app_id = str(bot.application_id)
+    if hashes.get(app_id) == digest:
+        print("슬래시 커맨드가 바뀌지 않아 동기화를 건너뜁니다.")
+        return False
+    synced = await bot.tree.sync()
+    print(f"{len(synced)}개의 슬래시 커맨드를 동기화했습니다.")
+    hashes[app_id] = digest
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(hashes, f)
+    os.replace(tmp, path)
+    return True
@@ -0,0 +1,134 @@
+import time
+
+# 여러 봇 프로세스가 세션과 캐시를 공유하기 위한 저장소.
+# 기본은 같은 SQLite 파일을 함께 쓰는 SQLiteStateBackend이고,
+# 여러 서버에 나눠 띄울 때는 STATE_BACKEND=redis://... 로 Redis를 사용합니다.
+
+SELECT_STATE = "SELECT data FROM shared_state WHERE namespace = ? AND key = ? AND expires_at > ?"
+UPSERT_STATE = "INSERT OR REPLACE INTO shared_state (namespace, key, data, expires_at) VALUES (?, ?, ?, ?)"
+DELETE_STATE = "DELETE FROM shared_state WHERE namespace = ? AND key = ?"
+COUNT_STATE = "SELECT COUNT(*) FROM shared_state WHERE namespace = ? AND expires_at > ?"
+PURGE_STATE = "DELETE FROM shared_state WHERE expires_at <= ?"
+ACQUIRE_LEASE = """
+INSERT INTO leases (name, owner, expires_at) VALUES (?, ?, ?)
+ON CONFLICT (name) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at
+WHERE leases.expires_at <= ? OR leases.owner = excluded.owner
+"""
+SELECT_LEASE_OWNER = "SELECT owner FROM leases WHERE name = ?"
+RELEASE_LEASE = "DELETE FROM leases WHERE name = ? AND owner = ?"
+PURGE_LEASES = "DELETE FROM leases WHERE expires_at <= ?"
+
+# 소유자가 같을 때만 지우는 Redis 스크립트 (다른 프로세스가 넘겨받은 lease를 지우지 않도록)
+REDIS_RELEASE = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+class SQLiteStateBackend:
+    """같은 DB 파일을 쓰는 프로세스끼리 상태를 공유합니다. (WAL 모드라 읽기는 서로 막지 않습니다.)"""
+
+    shares_database = True # 다른 테이블(생성 캐시 등)도 이미 같은 파일로 공유됩니다.
+
+    def __init__(self, db):
+        self.db = db
+
+    async def get(self, namespace: str, key) -> bytes:
+        row = await self.db.fetchone(SELECT_STATE, (namespace, str(key), time.time()))
+        return row[0] if row else None
+
+    async def set(self, namespace: str, key, data: bytes, ttl: float):
+        await self.db.execute(UPSERT_STATE, (namespace, str(key), data, time.time() + ttl))
+
+    async def delete(self, namespace: str, key):
+        await self.db.execute(DELETE_STATE, (namespace, str(key)))
+
+    async def count(self, namespace: str) -> int:
+        return (await self.db.fetchone(COUNT_STATE, (namespace, time.time())))[0]
+
+    async def acquire(self, name: str, owner: str, ttl: float) -> bool:
+        """lease가 비어 있거나 만료되었거나 이미 내 것이면 가져오고 True를 반환합니다."""
+        now = time.time()
+
+        def write(conn):
+            conn.execute(ACQUIRE_LEASE, (name, owner, now + ttl, now))
+            return conn.execute(SELECT_LEASE_OWNER, (name,)).fetchone()[0] == owner
+
+        return await self.db.run_write(write)
+
+    async def release(self, name: str, owner: str):
+        await self.db.execute(RELEASE_LEASE, (name, owner))
+
+    async def purge(self):
+        now = time.time()
+
+        def write(conn):
+            conn.execute(PURGE_STATE, (now,))
+            conn.execute(PURGE_LEASES, (now,))
+
+        await self.db.run_write(write)
+
+    async def close(self):
+        pass # DB는 봇이 닫습니다.
+
+class RedisStateBackend:
+    """Redis(또는 호환 서버)에 상태를 저장합니다. 만료는 Redis의 TTL에 맡깁니다."""
+
+    shares_database = False
+
+    def __init__(self, url: str, prefix: str = "charbot"):
+        try:
+            import redis.asyncio as redis
+        except ImportError:
+            raise RuntimeError("Redis 백엔드를 사용하려면 redis 패키지를 설치해주세요. (pip install redis)")
+        self._redis = redis.from_url(url)
+        self.prefix = prefix
+
+    def _key(self, namespace: str, key) -> str:
+        return f"{self.prefix}:{namespace}:{key}"
+
+    async def get(self, namespace: str, key) -> bytes:
+        return await self._redis.get(self._key(namespace, key))
+
+    async def set(self, namespace: str, key, data: bytes, ttl: float):
+        await self._redis.set(self._key(namespace, key), data, px=int(ttl * 1000))
+
+    async def delete(self, namespace: str, key):
+        await self._redis.delete(self._key(namespace, key))
+
+    async def count(self, namespace: str) -> int:
+        """키 이름을 훑어 셉니다. 느리므로 주기적인 통계 수집에만 사용합니다."""
+        count = 0
+        async for _ in self._redis.scan_iter(match=self._key(namespace, "*"), count=1000):
+            count += 1
+        return count
+
+    async def acquire(self, name: str, owner: str, ttl: float) -> bool:
+        key = self._key("lease", name)
+        if await self._redis.set(key, owner, nx=True, px=int(ttl * 1000)):
+            return True
+        # 이미 내 lease라면 만료 시간만 늘립니다.
+        if await self._redis.get(key) == owner.encode():
+            await self._redis.pexpire(key, int(ttl * 1000))
+            return True
+        return False
+
+    async def release(self, name: str, owner: str):
+        await self._redis.eval(REDIS_RELEASE, 1, self._key("lease", name), owner)
+
+    async def purge(self):
+        pass
+
+    async def close(self):
+        await self._redis.aclose()
+
+def create_backend(spec: str, db):
+    """STATE_BACKEND 값으로 저장소를 만듭니다. 비어 있으면 None(프로세스 전용 상태)을 반환합니다."""
+    if not spec:
+        return None
+    if spec == "sqlite":
+        return SQLiteStateBackend(db)
+    if spec.startswith(("redis://", "rediss://", "unix://")):
+        return RedisStateBackend(spec)
+    raise ValueError(f"알 수 없는 STATE_BACKEND 값입니다: {spec}")
@@ -0,0 +1,183 @@
+import time
+import discord
+from metrics import WaitTimer, record_gemini
+
+MESSAGE_LIMIT = 2000 # 일반 메시지 최대 길이
+EMBED_LIMIT = 4096 # 임베드 description 최대 길이
+
+async def generate_text(model, contents, stream: bool = True, retry=None):
+    """Gemini 응답 텍스트를 청크 단위로 돌려주는 비동기 제너레이터.
+
+    retry가 주어지면 요청을 여는 호출을 retry(fn)으로 감싸 재시도합니다.
+    """
+    request = lambda: model.generate_content_async(contents, stream=stream)
+    timer = WaitTimer()
+    try:
+        response = await timer.wait(retry(request) if retry else request())
+        if not stream:
+            text = response.text
+        else:
+            async for chunk in timer.wrap(response):
+                try:
+                    text = chunk.text
+                except ValueError:
+                    # 안전 필터 등으로 텍스트가 없는 청크는 건너뜁니다.
+                    continue
+                if text:
+                    yield text
+    except Exception as e:
+        record_gemini(model, timer.elapsed, error=e)
+        raise
+    # 스트리밍 응답의 usage_metadata는 마지막 청크까지 받은 뒤에 채워집니다.
+    record_gemini(model, timer.elapsed, response)
+    if not stream:
+        yield text
+
+def _split_point(text: str, limit: int) -> int:
+    """limit 안에서 줄바꿈이나 공백 위치를 우선으로 자를 지점을 찾습니다."""
+    for sep in ("\n", " "):
+        cut = text.rfind(sep, 0, limit)
+        if cut >= limit // 2:
+            return cut + 1
+    return limit
+
+def split_text(text: str, limit: int) -> list:
+    """렌더러와 같은 기준으로 text를 limit 이하의 조각으로 나눕니다. 공백뿐인 조각은 뺍니다."""
+    parts = []
+    while len(text) > limit:
+        cut = _split_point(text, limit)
+        parts.append(text[:cut])
+        text = text[cut:]
+    parts.append(text)
+    return [part for part in parts if part.strip()]
+
+class StreamRenderer:
+    """청크가 도착할 때마다 디스코드 메시지를 수정해 응답을 점진적으로 보여줍니다.
+
+    수정은 edit_interval 초에 한 번으로 제한하고, 길이 제한을 넘으면
+    현재 메시지를 확정한 뒤 이어지는 새 메시지로 넘어갑니다.
+    """
+
+    limit = MESSAGE_LIMIT
+
+    def __init__(self, edit_interval: float = 1.0):
+        self.edit_interval = edit_interval
+        self.text = "" # 지금까지 받은 전체 응답
+        self.messages = [] # 보낸 메시지들 (이어지는 메시지 포함)
+        self._buffer = "" # 현재 메시지에 표시할 내용
+        self._shown = None # 현재 메시지에 마지막으로 반영된 내용
+        self._sealed = "" # 길이 제한으로 확정된 직전 메시지의 내용
+        self._last_edit = 0.0
+        self.started_at = time.perf_counter()
+        self.first_visible_at = None
+
+    @property
+    def time_to_first_token(self):
+        """요청 시작부터 첫 청크가 화면에 보이기까지 걸린 시간(초)."""
+        if self.first_visible_at is None:
+            return None
+        return self.first_visible_at - self.started_at
+
+    async def _send(self, content: str):
+        raise NotImplementedError
+
+    async def _edit(self, message, content: str):
+        raise NotImplementedError
+
+    async def _flush(self):
+        # 이미 보이는 내용과 같으면 수정하지 않습니다. (한 번에 도착한 응답은 send 한 번으로 끝납니다)
+        if not self._buffer.strip() or self._buffer == self._shown:
+            return
+        if self._shown is None:
+            self.messages.append(await self._send(self._buffer))
+            if self.first_visible_at is None:
+                self.first_visible_at = time.perf_counter()
+        else:
+            await self._edit(self.messages[-1], self._buffer)
+        self._shown = self._buffer
+        self._last_edit = time.perf_counter()
+
+    async def feed(self, chunk: str):
+        self.text += chunk
+        self._buffer += chunk
+        while len(self._buffer) > self.limit:
+            cut = _split_point(self._buffer, self.limit)
+            rest = self._buffer[cut:]
+            self._buffer = self._buffer[:cut]
+            await self._flush()
+            self._sealed = self._buffer
+            self._buffer, self._shown = rest, None
+        if self._shown is None or time.perf_counter() - self._last_edit >= self.edit_interval:
+            await self._flush()
+
+    async def render(self, chunks) -> str:
+        """청크 스트림을 모두 표시하고 전체 텍스트를 반환합니다."""
+        async for chunk in chunks:
+            await self.feed(chunk)
+        if not self.text.strip():
+            raise ValueError("Gemini가 빈 응답을 반환했습니다.")
+        await self._flush()
+        return self.text
+
+class ChannelStreamRenderer(StreamRenderer):
+    """채널 메시지로 응답을 표시합니다."""
+
+    def __init__(self, channel: discord.abc.Messageable, **kwargs):
+        super().__init__(**kwargs)
+        self.channel = channel
+
+    async def _send(self, content):
+        return await self.channel.send(content)
+
+    async def _edit(self, message, content):
+        await message.edit(content=content)
+
+class EmbedStreamRenderer(StreamRenderer):
+    """interaction followup 임베드로 응답을 표시합니다.
+
+    첫 임베드에만 제목을 달고, 마지막 임베드에 footer와 view를 붙입니다.
+    defer(ephemeral=True)의 설정은 첫 followup에만 이어지므로, 이어지는 임베드에도 ephemeral을 직접 넘깁니다.
+    """
+
+    limit = EMBED_LIMIT
+
+    def __init__(self, interaction: discord.Interaction, title: str, color: discord.Color,
+                 footer: str = None, view: discord.ui.View = None, ephemeral: bool = True, **kwargs):
+        super().__init__(**kwargs)
+        self.interaction = interaction
+        self.title = title
+        self.color = color
+        self.footer = footer
+        self.view = view
+        self.ephemeral = ephemeral
+        self._finished = False
+
+    def _embed(self, content: str, first: bool) -> discord.Embed:
+        embed = discord.Embed(title=self.title if first else None, description=content, color=self.color)
+        if self._finished and self.footer:
+            embed.set_footer(text=self.footer)
+        return embed
+
+    def _view_kwargs(self):
+        return {"view": self.view} if self._finished and self.view is not None else {}
+
+    async def _send(self, content):
+        embed = self._embed(content, first=not self.messages)
+        return await self.interaction.followup.send(embed=embed, ephemeral=self.ephemeral, wait=True, **self._view_kwargs())
+
+    async def _edit(self, message, content):
+        embed = self._embed(content, first=message is self.messages[0])
+        await message.edit(embed=embed, **self._view_kwargs())
+
+    async def render(self, chunks) -> str:
+        async for chunk in chunks:
+            await self.feed(chunk)
+        if not self.text.strip():
+            raise ValueError("Gemini가 빈 응답을 반환했습니다.")
+        self._finished = True
+        # 마지막 임베드는 내용이 그대로여도 footer와 view를 붙이기 위해 한 번 더 수정합니다.
+        if self._shown is None and self._buffer.strip():
+            await self._flush()
+        else:
+            await self._edit(self.messages[-1], self._buffer if self._shown is not None else self._sealed)
+        return self.text
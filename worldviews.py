@@ -0,0 +1,96 @@
+import uuid
+from prefix_index import PrefixIndex
+
+VERSION_NAMESPACE = "version"
+VERSION_TTL = 365 * 24 * 3600
+
+class WorldviewCatalog:
+    """세계관 목록을 메모리에 보관하는 카탈로그.
+
+    시작할 때 한 번만 DB에서 읽고, 이후 조회는 모두 메모리에서 처리합니다.
+    세계관 설명은 `/worldview edit`을 통해서만 바뀌므로, 수정 시 DB에 먼저 쓰고
+    성공하면 메모리도 함께 갱신합니다 (write-through).
+
+    backend를 주면(여러 프로세스 모드) 수정할 때 공유 저장소의 버전 값을 바꾸고,
+    다른 프로세스는 refresh()에서 버전이 달라졌으면 DB에서 다시 읽습니다.
+    """
+
+    def __init__(self, db, backend=None):
+        self.db = db
+        self.backend = backend
+        self._version = None # 마지막으로 읽은 공유 버전
+        self._worldviews = {} # key: name, value: description (id 순서 유지)
+        self._index = PrefixIndex() # 자동완성용 이름 인덱스
+        self._listeners = []
+        self.hits = 0
+        self.misses = 0
+
+    async def load(self):
+        """DB에서 전체 세계관을 읽어 카탈로그를 채웁니다. 설명이 바뀐 세계관은 listener에 알립니다."""
+        if self.backend is not None:
+            # 버전을 먼저 읽어야, 읽는 도중에 수정된 내용도 다음 refresh()에서 다시 읽힙니다.
+            self._version = await self.backend.get(VERSION_NAMESPACE, "worldviews")
+        rows = await self.db.get_worldviews()
+        old, self._worldviews = self._worldviews, {name: description for name, description in rows}
+        self._index = PrefixIndex(self._worldviews)
+        for name, description in self._worldviews.items():
+            if name in old and old[name] != description:
+                for callback in self._listeners:
+                    callback(name, description)
+
+    async def refresh(self):
+        """다른 프로세스가 세계관을 수정했으면 다시 읽습니다. 공유 모드가 아니면 아무것도 하지 않습니다."""
+        if self.backend is None:
+            return
+        if await self.backend.get(VERSION_NAMESPACE, "worldviews") != self._version:
+            await self.load()
+
+    def add_listener(self, callback):
+        """세계관이 수정될 때 callback(name, description)을 호출하도록 등록합니다."""
+        self._listeners.append(callback)
+
+    def names(self):
+        return list(self._worldviews)
+
+    def items(self):
+        return list(self._worldviews.items())
+
+    def search(self, query: str, limit: int = 25):
+        """이름이 query로 시작하는(초성 포함) 세계관을 반환합니다."""
+        return self._index.search(query, limit)
+
+    def __contains__(self, name):
+        return name in self._worldviews
+
+    def __len__(self):
+        return len(self._worldviews)
+
+    def get_description(self, name: str):
+        """세계관 설명을 반환합니다. 없는 세계관이면 None을 반환합니다."""
+        description = self._worldviews.get(name)
+        self.record_lookup(description is not None)
+        return description
+
+    def record_lookup(self, found: bool):
+        """적중률 통계에 조회 한 번을 더합니다. 다른 캐시(ModelRegistry의 지침 등)가 대신 답한 조회도 여기로 셉니다."""
+        if found:
+            self.hits += 1
+        else:
+            self.misses += 1
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    async def update_description(self, name: str, description: str) -> bool:
+        """DB를 수정한 뒤 성공하면 캐시를 갱신합니다."""
+        if not await self.db.update_worldview_description(name, description):
+            return False
+        self._worldviews[name] = description
+        for callback in self._listeners:
+            callback(name, description)
+        if self.backend is not None:
+            # 내 버전으로 기록해 두지 않으므로, 그사이 다른 프로세스가 바꾼 내용도 다음 refresh()에서 함께 읽습니다.
+            await self.backend.set(VERSION_NAMESPACE, "worldviews", uuid.uuid4().hex.encode(), VERSION_TTL)
+        return True